@@ -1,4 +1,5 @@
 import streamlit as st
+from utils.profile_util import RerunTimer
 
 # Initialize session state for login status
 if 'logged_in' not in st.session_state:
@@ -27,6 +28,7 @@ def local_css():
         st.markdown(style, unsafe_allow_html=True)
 
 def main():
+    rerun_timer = RerunTimer("Home")
     st.set_page_config(page_title="Process Control AI Assistant", page_icon="🏠")
     local_css()
 
@@ -98,5 +100,7 @@ def main():
             else:
                 st.error('Invalid email or password')
 
+    rerun_timer.stop()
+
 if __name__ == "__main__":
     main()
@@ -1,9 +1,11 @@
 import streamlit as st
 from utils.api_util import get_chat_response
+from utils.profile_util import RerunTimer
 import uuid
 
 # Controller ID for this page
 CONTROLLER_ID = "pwo-sep-t-crushing-pwo"
+rerun_timer = RerunTimer(CONTROLLER_ID)
 
 # Streamlit UI
 st.title("PWO-SEP-T-CRUSHING-PWO Chat")
@@ -51,3 +53,5 @@ if prompt := st.chat_input("What is your question?"):
         st.markdown(response)
     # Add assistant response to chat history
     st.session_state.messages.append({"role": "assistant", "content": response})
+
+rerun_timer.stop()
@@ -1,7 +1,9 @@
 import streamlit as st
-import pandas as pd
 import json
 from utils.api_util import get_api_response
+from utils.profile_util import RerunTimer
+
+rerun_timer = RerunTimer("ADX Query Generator")
 
 # Streamlit UI
 st.title("ADX Query Generator")
@@ -125,6 +127,8 @@ if st.button("Execute SQL"):
             if not results_response.get("error"):
                 results = results_response.get("data", [])
                 if results:
+                    # Imported here: pandas is only needed to show query results
+                    import pandas as pd
                     df = pd.DataFrame(results)
                     st.subheader("Query Result:")
                     st.dataframe(df)
@@ -136,3 +140,5 @@ if st.button("Execute SQL"):
             st.error(f"Error executing SQL: {str(e)}")
     else:
         st.warning("Please enter an SQL query to execute.")
+
+rerun_timer.stop()
@@ -2,6 +2,9 @@ import streamlit as st
 import json
 from datetime import datetime
 from utils.api_util import get_api_response
+from utils.profile_util import RerunTimer
+
+rerun_timer = RerunTimer("EventHub Tester")
 
 # Streamlit UI
 st.title("EventHub Tester")
@@ -138,3 +141,5 @@ else:
 if st.session_state.message_log and st.button("Clear Message Log"):
     st.session_state.message_log = []
     st.rerun()
+
+rerun_timer.stop()
@@ -1,8 +1,13 @@
 import streamlit as st
 import json
 from pathlib import Path
+from utils.profile_util import RerunTimer
 
-def load_json(file_path):
+rerun_timer = RerunTimer("System Alerts Viewer")
+
+@st.cache_data
+def load_json(file_path, modified):
+    """Parsed report, re-read only when its modification time changes."""
     with open(file_path, 'r') as f:
         return json.load(f)
 
@@ -10,7 +15,7 @@ st.title("System Alerts Viewer")
 
 # Load the JSON data
 json_path = Path("reports/system_alerts_enriched.json")
-data = load_json(json_path)
+data = load_json(json_path, json_path.stat().st_mtime)
 
 # Display each message in an expander
 for i, message in enumerate(data, 1):
@@ -27,3 +32,5 @@ for i, message in enumerate(data, 1):
         
         st.write("**Model Response:**")
         st.write(message['follow_up_answer'])
+
+rerun_timer.stop()
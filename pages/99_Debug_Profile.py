@@ -0,0 +1,50 @@
+import sys
+import time
+import streamlit as st
+from utils import api_util
+from utils.profile_util import RerunTimer, PROCESS_STARTED, PROFILED_MODULES, rerun_stats, import_profile
+
+rerun_timer = RerunTimer("Debug Profile")
+
+# Modules worth keeping out of a cold start, shown with whether this process has loaded them
+HEAVY_MODULES = ("pandas", "numpy", "openai", "azure.search.documents", "tiktoken")
+
+@st.cache_resource(show_spinner="Profiling cold imports...")
+def cached_import_profile(modules):
+    """Import profile of a fresh interpreter; computed once per server process until cleared."""
+    return import_profile(modules)
+
+st.title("Debug Profile")
+
+# Process overview
+col1, col2, col3 = st.columns(3)
+col1.metric("Process uptime", f"{(time.time() - PROCESS_STARTED) / 60:.1f} min")
+col2.metric("Loaded modules", len(sys.modules))
+col3.metric("API base URL", "set" if api_util.get_api_base_url() else "missing")
+
+st.subheader("Heavy modules in this process")
+st.write({module: module in sys.modules for module in HEAVY_MODULES})
+
+# Page script timings, recorded by every page since the process started
+st.subheader("Rerun times")
+stats = rerun_stats()
+if stats:
+    st.dataframe(stats)
+else:
+    st.info("No page runs recorded yet.")
+
+# Cold import times, measured in a subprocess so this process's imports do not hide them
+st.subheader("Cold import times")
+modules = st.multiselect("Modules", PROFILED_MODULES, default=list(PROFILED_MODULES))
+if modules:
+    profile = cached_import_profile(tuple(modules))
+    st.caption(f"Slowest {len(profile)} imports by cumulative time, in a fresh interpreter")
+    st.dataframe(profile)
+
+if st.button("Clear caches"):
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    api_util.get_api_base_url.cache_clear()
+    st.rerun()
+
+rerun_timer.stop()
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+# Add the parent directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import tiktoken
+from utils.chat_chunker_util import CHUNK_OVERLAP, chunk_context, count_tokens, get_encoding
+
+WORDS = ["controller", "bin", "level", "feeder", "crusher", "setpoint", "gain", "conveyor",
+         "PID-J141-LIC-G1118.OP", "manipulated", "variable", "disturbance", "limit", "0.53", "the", "of"]
+
+def make_context(target_tokens, seed=0):
+    """Build synthetic manual-like text of roughly target_tokens tokens."""
+    rng = random.Random(seed)
+    encoding = get_encoding()
+    sentences = []
+    sentence = []
+    word_count = 0
+    while word_count < target_tokens:
+        sentence.append(rng.choice(WORDS))
+        word_count += 1
+        if len(sentence) >= rng.randint(8, 20):
+            sentences.append(" ".join(sentence) + ".")
+            sentence = []
+    text = " ".join(sentences + sentence)
+    # Trim to the requested size in tokens
+    return encoding.decode(encoding.encode_ordinary(text)[:target_tokens])
+
+def legacy_count_tokens(text, model="gpt-4"):
+    encoding = tiktoken.encoding_for_model(model)
+    return len(encoding.encode(text))
+
+def legacy_chunk_context(context, max_tokens):
+    """Token-by-token chunker used before the stride-based rewrite."""
+    encoding = tiktoken.encoding_for_model("gpt-4")
+    tokens = encoding.encode(context)
+
+    chunks = []
+    current_chunk = []
+    current_length = 0
+
+    for token in tokens:
+        current_chunk.append(token)
+        current_length += 1
+
+        if current_length >= max_tokens:
+            chunks.append(encoding.decode(current_chunk))
+            current_chunk = current_chunk[-CHUNK_OVERLAP:]
+            current_length = len(current_chunk)
+
+    if current_chunk:
+        chunks.append(encoding.decode(current_chunk))
+
+    return chunks
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat_chunker_util against the legacy chunker.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000], help="Context sizes in tokens")
+    parser.add_argument("--max-tokens", type=int, default=10_000, help="Chunk size in tokens")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, best is reported")
+    args = parser.parse_args()
+
+    print(f"{'tokens':>10} {'legacy chunk':>14} {'chunk':>10} {'speedup':>8} {'legacy count':>14} {'count (cached)':>15}")
+    for size in args.sizes:
+        context = make_context(size)
+        legacy_chunk = best_of(lambda: legacy_chunk_context(context, args.max_tokens), args.repeat)
+        chunk = best_of(lambda: chunk_context(context, args.max_tokens), args.repeat)
+        legacy_count = best_of(lambda: legacy_count_tokens(context), args.repeat)
+        count_tokens(context)
+        cached_count = best_of(lambda: count_tokens(context), args.repeat)
+        print(f"{size:>10} {legacy_chunk * 1000:>12.1f}ms {chunk * 1000:>8.1f}ms {legacy_chunk / chunk:>7.1f}x "
+              f"{legacy_count * 1000:>12.1f}ms {cached_count * 1000:>13.2f}ms")
+
+if __name__ == "__main__":
+    main()
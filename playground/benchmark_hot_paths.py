@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import itertools
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+# Sizes at --scale 1, chosen to match production inputs
+TELEMETRY_ROWS = 2_000_000  # Rows of an ADX telemetry export
+GAINS_ROWS = 200_000  # Rows of a raw gains map export
+PDF_PAGES = 500  # Pages of a manual
+XLSX_ROWS = 100_000  # Rows of a spreadsheet document
+CONTEXT_TOKENS = 500_000  # Tokens of retrieved context to chunk
+TEXT_CHARS = 5_000_000  # Characters of document text to chunk for indexing
+
+BENCHMARK_DATA_DIR = os.path.join(".cache", "benchmark")  # Generated inputs, reused across runs
+DEFAULT_TOLERANCE = 0.25  # Allowed slowdown or memory growth over the baseline before failing
+APC_NAMES = ['APC-J140_BIN_005C', 'APC-J141_LIC_005C', 'APC-J141_LIC_002_004C', 'PWO-SEP-T-CRUSHING']
+WORDS = ["controller", "bin", "level", "feeder", "crusher", "setpoint", "gain", "conveyor", "screen",
+         "PID-J141-LIC-G1118.OP", "manipulated", "variable", "disturbance", "limit", "0.53", "the", "of", "and"]
+
+def make_words(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+def make_text(chars, seed=0):
+    """Manual-like text with sentences and paragraphs, about chars characters long."""
+    rng = random.Random(seed)
+    paragraphs = []
+    length = 0
+    while length < chars:
+        paragraph = " ".join(make_words(rng, rng.randint(8, 20)).capitalize() + "." for _ in range(rng.randint(3, 8)))
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:chars]
+
+def make_telemetry_csv(file_path, rows, seed=0):
+    """ADX tag value export with about 5% of the values outside their limits."""
+    rng = np.random.default_rng(seed)
+    tag_count = max(rows // 1000, 10)
+    tags = np.array([f"{APC_NAMES[i % len(APC_NAMES)]}.PID-J14{i % 10}-LIC-G{1000 + i}.PV" for i in range(tag_count)])
+    minimums = rng.uniform(0, 50, tag_count).round(2)
+    maximums = (minimums + rng.uniform(10, 50, tag_count)).round(2)
+    tag_ids = rng.integers(0, tag_count, rows)
+    spans = maximums[tag_ids] - minimums[tag_ids]
+    values = minimums[tag_ids] + spans * rng.uniform(-0.025, 1.025, rows)
+    pd.DataFrame({
+        'Timestamp': pd.date_range("2024-01-01", periods=rows, freq="s").astype(str),
+        'IDX_TagName': tags[tag_ids],
+        'ValueReal': values.round(3),
+        'IDX_Minimum': minimums[tag_ids],
+        'IDX_Maximum': maximums[tag_ids]
+    }).to_csv(file_path, index=False)
+
+def make_gains_map(rows, seed=0):
+    """Raw gains map export with the columns format_gains_map expects."""
+    rng = np.random.default_rng(seed)
+    cv_ids = rng.integers(0, max(rows // 50, 2), rows)
+    mvdv_ids = rng.integers(0, 200, rows)
+    cv_areas = np.where(cv_ids % 3 == 0, "J140-BIN", "J141-LIC")
+    gain_variables = np.where(cv_ids % 2 == 0, "PROFIT_AVERAGE_BIN_LEVEL", "PROFIT_FEEDER_SPEED")
+    return pd.DataFrame({
+        'CVNAME': [f"CV {i}" for i in cv_ids],
+        'CVAPETTAG': [f"PID-{area}-{i}.{variable}" for area, i, variable in zip(cv_areas, cv_ids, gain_variables)],
+        'TYPE': rng.choice(['MV', 'DV'], rows),
+        'MVDVNAME': [f"Tert_Crusher_Feeder_{i}" for i in mvdv_ids],
+        'MVDVAPETTAG': [f"PID-J141-SIC-G{i}.OP" for i in mvdv_ids],
+        'MVDVNUMBER': mvdv_ids,
+        'GAIN-VALUE': rng.normal(0, 1, rows).round(4),
+        'GAIN-TAG': [f"{variable}.GAIN" for variable in gain_variables]
+    })
+
+def make_pdf(file_path, pages, lines_per_page=40, seed=0):
+    """A text PDF with one Helvetica text block per page, written without a PDF library."""
+    rng = random.Random(seed)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(" ".join(f"{4 + 2 * i} 0 R" for i in range(pages)), pages),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    for page in range(pages):
+        lines = " T* ".join(f"({make_words(rng, 12)}) Tj" for _ in range(lines_per_page))
+        stream = f"BT /F1 9 Tf 11 TL 40 760 Td {lines} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * page} 0 R >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    with open(file_path, 'wb') as f:
+        offsets = []
+        f.write(b"%PDF-1.4\n")
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+        f.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1"))
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+
+def make_xlsx(file_path, rows, seed=0):
+    """A single-sheet workbook of tag readings, written in streaming mode."""
+    import openpyxl
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Readings")
+    worksheet.append(["Tag", "Description", "Value", "Minimum", "Maximum"])
+    for i in range(rows):
+        worksheet.append([f"PID-J141-LIC-G{1000 + i % 500}.PV", make_words(rng, 6),
+                          round(rng.uniform(0, 100), 3), 10.0, 90.0])
+    workbook.save(file_path)
+
+def generated_file(data_dir, name, generate, *args):
+    """Path of a generated input, creating it on first use so repeated runs measure the same file."""
+    os.makedirs(data_dir, exist_ok=True)
+    file_path = os.path.join(data_dir, name)
+    if not os.path.exists(file_path):
+        logging.info(f"Generating {file_path}")
+        tmp_path = f"{file_path}.tmp{os.path.splitext(name)[1]}"
+        generate(tmp_path, *args)
+        os.replace(tmp_path, file_path)
+    return file_path
+
+def scaled(size, scale):
+    return max(int(size * scale), 1)
+
+def build_benchmarks(scale, data_dir):
+    """
+    Benchmarks by name, as (description, setup) pairs.
+
+    setup() prepares the inputs outside the measurement and returns the
+    function that is timed.
+    """
+    def telemetry_setup():
+        from utils.telemetry_util import load_and_filter_data
+        rows = scaled(TELEMETRY_ROWS, scale)
+        datasource = generated_file(data_dir, f"telemetry_{rows}.csv", make_telemetry_csv, rows)
+        return lambda: load_and_filter_data(datasource, APC_NAMES[0])
+
+    def violations_setup():
+        from utils.telemetry_util import get_treshold_violations
+        rows = scaled(TELEMETRY_ROWS, scale)
+        df = pd.read_csv(generated_file(data_dir, f"telemetry_{rows}.csv", make_telemetry_csv, rows))
+        return lambda: get_treshold_violations(df)
+
+    def gains_setup():
+        from utils.telemetry_util import format_gains_map
+        df = make_gains_map(scaled(GAINS_ROWS, scale))
+        return lambda: format_gains_map(df)
+
+    def count_tokens_setup():
+        from utils.chat_chunker_util import count_tokens
+        text = make_text(scaled(CONTEXT_TOKENS, scale) * 4)
+        # A new suffix per run, so every run misses the token count cache
+        suffixes = itertools.count()
+        return lambda: count_tokens(f"{text} {next(suffixes)}")
+
+    def chunk_context_setup():
+        from utils.chat_chunker_util import chunk_context, MAX_TOKENS
+        text = make_text(scaled(CONTEXT_TOKENS, scale) * 4)
+        return lambda: chunk_context(text, MAX_TOKENS)
+
+    def chunk_text_setup():
+        from tasks.create_index import chunk_text
+        text = make_text(scaled(TEXT_CHARS, scale))
+        return lambda: chunk_text(text)
+
+    def pdf_setup():
+        from tasks.create_index import iter_pdf_pages
+        pages = scaled(PDF_PAGES, scale)
+        file_path = generated_file(data_dir, f"manual_{pages}.pdf", make_pdf, pages)
+        return lambda: sum(len(text) for _, text in iter_pdf_pages(file_path))
+
+    def pdf_chunk_setup():
+        from tasks.create_index import iter_pdf_pages, chunk_pages
+        pages = scaled(PDF_PAGES, scale)
+        file_path = generated_file(data_dir, f"manual_{pages}.pdf", make_pdf, pages)
+        page_texts = list(iter_pdf_pages(file_path))
+        return lambda: sum(1 for _ in chunk_pages(page_texts))
+
+    def xlsx_setup():
+        from tasks.create_index import iter_xlsx_row_groups
+        rows = scaled(XLSX_ROWS, scale)
+        file_path = generated_file(data_dir, f"readings_{rows}.xlsx", make_xlsx, rows)
+        return lambda: sum(len(text) for _, text in iter_xlsx_row_groups(file_path))
+
+    return {
+        "load_and_filter_data": (f"{scaled(TELEMETRY_ROWS, scale):,} telemetry rows", telemetry_setup),
+        "get_treshold_violations": (f"{scaled(TELEMETRY_ROWS, scale):,} telemetry rows", violations_setup),
+        "format_gains_map": (f"{scaled(GAINS_ROWS, scale):,} gains map rows", gains_setup),
+        "count_tokens": (f"~{scaled(CONTEXT_TOKENS, scale):,} tokens, uncached", count_tokens_setup),
+        "chunk_context": (f"~{scaled(CONTEXT_TOKENS, scale):,} tokens", chunk_context_setup),
+        "chunk_text": (f"{scaled(TEXT_CHARS, scale):,} characters", chunk_text_setup),
+        "iter_pdf_pages": (f"{scaled(PDF_PAGES, scale):,} page PDF", pdf_setup),
+        "chunk_pages": (f"{scaled(PDF_PAGES, scale):,} extracted PDF pages", pdf_chunk_setup),
+        "iter_xlsx_row_groups": (f"{scaled(XLSX_ROWS, scale):,} row workbook", xlsx_setup),
+    }
+
+def measure(run, repeat):
+    """
+    Best wall time over repeat runs, then the peak traced memory of one more run.
+
+    Memory is measured separately because tracing allocations slows the
+    code down. NumPy and pandas buffers are included in the trace.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(timings), "median_seconds": float(np.median(timings)), "peak_mb": peak / (1024 * 1024)}
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of results against a baseline.
+
+    Returns:
+        list: (name, metric, baseline value, current value) for each time or
+        peak memory more than tolerance above the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            if previous[metric] > 0 and result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((name, metric, previous[metric], result[metric]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CPU hot paths on synthetic data at production sizes.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier of the input sizes, e.g. 0.01 for a quick run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark, best is reported")
+    parser.add_argument("--only", nargs="+", help="Benchmarks to run, by name")
+    parser.add_argument("--data-dir", default=BENCHMARK_DATA_DIR, help="Directory of generated inputs")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against a baseline JSON file, exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    benchmarks = build_benchmarks(args.scale, args.data_dir)
+    unknown = set(args.only or []) - set(benchmarks)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {sorted(unknown)}, expected some of {list(benchmarks)}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != args.scale:
+            logging.warning(f"Baseline was recorded at scale {baseline.get('scale')}, comparing against scale {args.scale}")
+
+    print(f"{'benchmark':<24} {'input':<32} {'best':>10} {'median':>10} {'peak mem':>10} {'vs baseline':>12}")
+    results = {}
+    for name, (description, setup) in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        result = measure(setup(), args.repeat)
+        result["input"] = description
+        results[name] = result
+
+        versus = ""
+        previous = (baseline or {}).get("results", {}).get(name)
+        if previous:
+            versus = f"{result['seconds'] / previous['seconds']:.2f}x"
+        print(f"{name:<24} {description:<32} {result['seconds'] * 1000:>8.1f}ms {result['median_seconds'] * 1000:>8.1f}ms "
+              f"{result['peak_mb']:>8.1f}MB {versus:>12}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({
+                "scale": args.scale,
+                "repeat": args.repeat,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "recorded": time.strftime('%Y-%m-%d %H:%M:%S'),
+                "results": results
+            }, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, previous, current in regressions:
+            print(f"REGRESSION {name}: {metric} {previous:.3f} -> {current:.3f} (+{(current / previous - 1) * 100:.0f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.compare}")
+
+if __name__ == "__main__":
+    main()
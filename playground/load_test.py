@@ -0,0 +1,359 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import resource
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+# Add the parent directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from utils import api_util
+
+# Default latency of each fake endpoint, as "fixed:ms", "uniform:low_ms:high_ms" or "lognormal:median_ms:sigma"
+DEFAULT_LATENCIES = {
+    "chat": "lognormal:1500:0.5",  # LLM answer over retrieved context
+    "schema": "fixed:50",
+    "generate-sql": "lognormal:800:0.4",
+    "execute-sql": "lognormal:300:0.6",
+    "eventhub": "uniform:50:150"
+}
+# Relative frequency of the actions of a virtual user; operators mostly chat
+DEFAULT_MIX = {"chat": 70, "schema": 5, "generate-sql": 10, "execute-sql": 10, "eventhub": 5}
+ANSWER_CHARS = 1500  # Characters of a fake chat answer
+RESULT_ROWS = 200  # Rows returned by a fake SQL execution
+SCHEMA_TABLES = 20  # Tables in the fake schema
+MEMORY_SAMPLE_INTERVAL = 0.5  # Seconds between RSS samples
+PERCENTILES = (50, 90, 95, 99)
+QUESTIONS = ["Why is the bin level above its maximum?", "What does PID-J141-LIC-G1118.OP control?",
+             "How should the feeder speed be adjusted?", "Describe the crusher interlocks."]
+CONTROLLER_IDS = ["apc-j141-lic-005c", "apc-j140-bin-005c", "apc-j141-lic-002-004c", "pwo-sep-t-crushing-pwo"]
+
+def parse_latency(spec):
+    """
+    Sampler of response delays in seconds from a distribution spec.
+
+    "fixed:200" always waits 200 ms, "uniform:50:150" draws between 50 and
+    150 ms and "lognormal:1500:0.5" has a median of 1500 ms with a long tail.
+    """
+    kind, *params = spec.split(":")
+    params = [float(param) for param in params]
+    if kind == "fixed" and len(params) == 1:
+        return lambda rng: params[0] / 1000
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(params[0], params[1]) / 1000
+    if kind == "lognormal" and len(params) == 2:
+        return lambda rng: rng.lognormvariate(np.log(params[0]), params[1]) / 1000
+    raise ValueError(f"Invalid latency spec: {spec}, expected fixed:ms, uniform:low:high or lognormal:median:sigma")
+
+def current_rss_mb():
+    """Resident memory of this process, from /proc where available, else the peak."""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class FakeBackend:
+    """
+    Local stand-in for the chat and data API, served from a thread per connection.
+
+    Responses have the shape the pages expect and are delayed by a draw from
+    each endpoint's latency distribution. A share of requests can fail with
+    503 to exercise error handling.
+
+        with FakeBackend(latencies) as backend:
+            os.environ["API_BASE_URL"] = backend.url
+    """
+
+    def __init__(self, latencies, answer_chars=ANSWER_CHARS, result_rows=RESULT_ROWS,
+                 schema_tables=SCHEMA_TABLES, error_rate=0.0, seed=0):
+        self.samplers = {endpoint: parse_latency(spec) for endpoint, spec in latencies.items()}
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.answer = ("The bin level controller responds to feeder speed changes. " * (answer_chars // 60 + 1))[:answer_chars]
+        self.rows = [{"Timestamp": f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}", "IDX_TagName": f"PID-J141-LIC-G{1000 + i}.PV",
+                      "ValueReal": round(i * 0.37, 3)} for i in range(result_rows)]
+        self.schema = [{"name": f"Table{i}", "columns": [{"name": f"Column{j}", "type": "real"} for j in range(12)]}
+                       for i in range(schema_tables)]
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def route(self, method, path, body):
+        """Endpoint name and response payload of a request, or None for an unknown path."""
+        if path in ("/chat", "/api/chat") and method == "POST":
+            request = json.loads(body or b"{}")
+            return "chat", {"answer": self.answer, "session_id": request.get("session_id"), "sources": ["manual.pdf"]}
+        if path == "/api/schema" and method == "GET":
+            return "schema", self.schema
+        if path == "/api/generate-sql" and method == "POST":
+            query = parse_qs(body.decode()).get("query", [""])[0]
+            return "generate-sql", {"sql": f"SELECT TOP 100 * FROM Table0 -- {query}"}
+        if path == "/api/execute-sql" and method == "POST":
+            return "execute-sql", self.rows
+        if path.startswith("/api/eventhub/") and method == "POST":
+            return "eventhub", {"status": "ok", "messages": self.rows[:10]}
+        return None
+
+    def delay(self, endpoint):
+        with self.rng_lock:
+            failed = self.rng.random() < self.error_rate
+            seconds = self.samplers[endpoint](self.rng)
+        time.sleep(seconds)
+        return failed
+
+    def _handler(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so pooled client sessions reuse their connections
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                routed = backend.route(method, self.path, body)
+                if routed is None:
+                    status, payload = 404, {"detail": "Not found"}
+                else:
+                    endpoint, payload = routed
+                    status = 503 if backend.delay(endpoint) else 200
+                    if status == 503:
+                        payload = {"detail": "Service unavailable"}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def run_action(action, rng):
+    """
+    Perform one action through utils/api_util, as the corresponding page does.
+
+    Returns:
+        bool: Whether the call succeeded.
+    """
+    if action == "chat":
+        response = api_util.get_chat_response(rng.choice(QUESTIONS), rng.choice(CONTROLLER_IDS),
+                                              session_id=f"load-test-{threading.get_ident()}")
+    elif action == "schema":
+        response = api_util.get_api_response("/schema", method="GET")
+    elif action == "generate-sql":
+        response = api_util.get_api_response("/generate-sql", method="POST",
+                                             payload={"query": rng.choice(QUESTIONS)}, use_form_data=True)
+    elif action == "execute-sql":
+        response = api_util.get_api_response("/execute-sql", method="POST",
+                                             payload={"sql": "SELECT TOP 100 * FROM Table0"}, use_form_data=True)
+    elif action == "eventhub":
+        response = api_util.get_api_response(rng.choice(["/eventhub/send", "/eventhub/read"]), method="POST")
+    else:
+        raise ValueError(f"Unknown action: {action}")
+    return not response.get("error")
+
+def virtual_user(user_id, mix, stop_at, think_time, samples, samples_lock):
+    """Run weighted random actions with think time between them until stop_at."""
+    rng = random.Random(user_id)
+    actions, weights = zip(*mix.items())
+    while time.perf_counter() < stop_at:
+        action = rng.choices(actions, weights)[0]
+        start = time.perf_counter()
+        ok = run_action(action, rng)
+        with samples_lock:
+            samples.append((action, time.perf_counter() - start, ok))
+        if think_time > 0:
+            time.sleep(rng.uniform(0.5, 1.5) * think_time)
+
+def sample_memory(stop_event, memory):
+    while not stop_event.is_set():
+        memory.append(current_rss_mb())
+        stop_event.wait(MEMORY_SAMPLE_INTERVAL)
+
+def run_load(users, duration, ramp_up, think_time, mix):
+    """
+    Drive the API client with concurrent virtual users.
+
+    Users start evenly over ramp_up seconds and run until duration seconds
+    after the first one started.
+
+    Returns:
+        tuple: (samples as (action, seconds, ok), RSS samples in MB, elapsed seconds)
+    """
+    samples, samples_lock = [], threading.Lock()
+    memory, stop_event = [current_rss_mb()], threading.Event()
+    monitor = threading.Thread(target=sample_memory, args=(stop_event, memory), daemon=True)
+    monitor.start()
+
+    started = time.perf_counter()
+    stop_at = started + duration
+    threads = []
+    for user_id in range(users):
+        thread = threading.Thread(target=virtual_user, args=(user_id, mix, stop_at, think_time, samples, samples_lock),
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+        if ramp_up > 0 and users > 1:
+            time.sleep(ramp_up / (users - 1) if user_id < users - 1 else 0)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop_event.set()
+    monitor.join()
+    memory.append(current_rss_mb())
+    return samples, memory, elapsed
+
+def summarize(samples, memory, elapsed, users):
+    """Throughput, latency percentiles per action and overall, and memory of a run."""
+    def latency_stats(latencies):
+        latencies = np.asarray(latencies) * 1000
+        stats = {f"p{p}_ms": round(float(np.percentile(latencies, p)), 1) for p in PERCENTILES}
+        stats.update(mean_ms=round(float(latencies.mean()), 1), max_ms=round(float(latencies.max()), 1))
+        return stats
+
+    summary = {
+        "users": users,
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "memory": {
+            "start_rss_mb": round(memory[0], 1),
+            "peak_rss_mb": round(max(memory + [peak_rss_mb()]), 1),
+            "per_user_mb": round((max(memory) - memory[0]) / users, 3) if users else 0.0
+        },
+        "actions": {}
+    }
+    if samples:
+        summary["latency"] = latency_stats([seconds for _, seconds, _ in samples])
+    for action in sorted({action for action, _, _ in samples}):
+        action_samples = [(seconds, ok) for name, seconds, ok in samples if name == action]
+        summary["actions"][action] = dict(
+            requests=len(action_samples),
+            errors=sum(1 for _, ok in action_samples if not ok),
+            **latency_stats([seconds for seconds, _ in action_samples])
+        )
+    return summary
+
+def print_summary(summary):
+    print(f"\n{summary['users']} users, {summary['requests']} requests in {summary['elapsed_seconds']}s: "
+          f"{summary['throughput_rps']} req/s, {summary['errors']} errors")
+    memory = summary["memory"]
+    print(f"Memory: {memory['start_rss_mb']} MB at start, {memory['peak_rss_mb']} MB peak, "
+          f"{memory['per_user_mb']} MB per user")
+    header = f"{'action':<14} {'requests':>9} {'errors':>7}" + "".join(f" {f'p{p}':>9}" for p in PERCENTILES) + f" {'max':>9}"
+    print(header)
+    rows = list(summary["actions"].items())
+    if "latency" in summary:
+        rows.append(("all", dict(summary["latency"], requests=summary["requests"], errors=summary["errors"])))
+    for action, stats in rows:
+        print(f"{action:<14} {stats['requests']:>9} {stats['errors']:>7}"
+              + "".join(f" {stats[f'p{p}_ms']:>7.0f}ms" for p in PERCENTILES) + f" {stats['max_ms']:>7.0f}ms")
+
+def parse_pairs(values, convert=str):
+    """NAME=VALUE command-line pairs as a dict."""
+    pairs = {}
+    for value in values or []:
+        name, _, setting = value.partition("=")
+        if not setting:
+            raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got {value}")
+        pairs[name] = convert(setting)
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the app's API client against a local fake backend.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 5, 10, 25], help="Concurrent virtual users; one run per value")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per run")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Seconds over which users start")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Mean seconds a user waits between actions")
+    parser.add_argument("--latency", nargs="+", metavar="ENDPOINT=SPEC",
+                        help=f"Latency distributions, e.g. chat=lognormal:1500:0.5; endpoints: {', '.join(DEFAULT_LATENCIES)}")
+    parser.add_argument("--mix", nargs="+", metavar="ACTION=WEIGHT", help="Relative action frequencies, e.g. chat=80")
+    parser.add_argument("--answer-chars", type=int, default=ANSWER_CHARS, help="Characters per chat answer")
+    parser.add_argument("--result-rows", type=int, default=RESULT_ROWS, help="Rows per SQL result")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests the backend fails with 503")
+    parser.add_argument("--backend-url", help="Load test this API instead of starting the fake backend")
+    parser.add_argument("--output", help="Write the summaries as JSON to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    latencies = dict(DEFAULT_LATENCIES, **parse_pairs(args.latency))
+    mix = dict(DEFAULT_MIX, **parse_pairs(args.mix, float))
+    mix = {action: weight for action, weight in mix.items() if weight > 0}
+
+    backend = None
+    if args.backend_url:
+        base_url = args.backend_url.rstrip("/")
+    else:
+        backend = FakeBackend(latencies, args.answer_chars, args.result_rows, error_rate=args.error_rate).start()
+        base_url = backend.url
+        logging.info(f"Fake backend listening on {base_url} with latencies {latencies}")
+    os.environ["API_BASE_URL"] = base_url
+    api_util.get_api_base_url.cache_clear()
+
+    summaries = []
+    try:
+        for users in args.users:
+            logging.info(f"Running {users} users for {args.duration}s")
+            samples, memory, elapsed = run_load(users, args.duration, args.ramp_up, args.think_time, mix)
+            summary = summarize(samples, memory, elapsed, users)
+            print_summary(summary)
+            summaries.append(summary)
+    finally:
+        if backend is not None:
+            backend.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"base_url": base_url, "latencies": latencies if backend else None, "mix": mix,
+                       "think_time": args.think_time, "runs": summaries}, f, indent=2)
+        logging.info(f"Wrote load test results to {args.output}")
+
+if __name__ == "__main__":
+    main()
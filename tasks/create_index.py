@@ -1,22 +1,26 @@
 import os
+import sys
 import json
 import logging
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents.indexes.models import (
-    SearchIndex,
-    SimpleField,
-    SearchableField,
-    SearchFieldDataType,
-    CustomAnalyzer,
-)
+import argparse
+import itertools
 from dotenv import load_dotenv
 import base64
-import PyPDF2
-import openpyxl
-import pandas as pd
-import time
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Add the parent directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from utils.index_manifest_util import IndexManifest, hash_file, hash_schema
+from utils.extraction_cache_util import ExtractionCache
+from utils import client_util
+from utils.trace_util import span
+
+# Document parsers, the search SDK models, the uploader and the BM25 index (NumPy) are
+# imported where they are used, so importing this module from other code stays cheap
 
 # Load environment variables
 load_dotenv()
@@ -27,87 +31,217 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Global variables
 DOCUMENT_DIR = "docs"
 CONFIG_FILE = "config/index_metadata_multi.json"
+PDF_PAGES_PER_TASK = 50  # Pages per extraction task when splitting large PDFs
+MAX_EXTRACTION_WORKERS = os.cpu_count() or 1  # Processes used for document extraction
+TABLE_ROWS_PER_GROUP = 50  # Spreadsheet/CSV rows per indexed chunk, header repeated in each
+TABLE_DOCUMENT_TYPES = ('xlsx', 'csv')  # Document types streamed in row groups
+CHUNK_SIZE = 2000  # Approximate number of characters per keyword index chunk
+CHUNK_OVERLAP = 200  # Number of characters to overlap between chunks
 
 # Azure AI Search configuration
 search_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
 search_key = os.getenv("AZURE_SEARCH_KEY")
-logging.info(f"Azure Search Endpoint: {search_endpoint}")
-logging.info(f"Azure Search Key: {'*' * len(search_key) if search_key else 'Not found'}")
-
-try:
-    search_credential = AzureKeyCredential(search_key)
-    logging.info("Azure credentials created successfully")
-except ValueError as e:
-    logging.error(f"Error creating Azure credentials: {str(e)}")
-    raise
-
-try:
-    # Initialize clients
-    search_index_client = SearchIndexClient(endpoint=search_endpoint, credential=search_credential, api_version="2023-10-01-Preview")
-    logging.info("Azure index client initialized successfully")
-except Exception as e:
-    logging.error(f"Error initializing Azure index client: {str(e)}")
-    raise
+
+@lru_cache(maxsize=None)
+def get_search_index_client():
+    """Index management client, created on first use so importing this module needs no credentials."""
+    logging.info(f"Azure Search Endpoint: {search_endpoint}")
+    logging.info(f"Azure Search Key: {'*' * len(search_key) if search_key else 'Not found'}")
+    try:
+        search_index_client = client_util.get_search_index_client(search_endpoint, search_key)
+        logging.info("Azure index client initialized successfully")
+    except (TypeError, ValueError) as e:
+        logging.error(f"Error initializing Azure index client: {str(e)}")
+        raise
+    return search_index_client
+
+def build_search_index(index_name):
+    """Define the keyword search index with its custom analyzer."""
+    from azure.search.documents.indexes.models import (
+        SearchIndex,
+        SimpleField,
+        SearchableField,
+        SearchFieldDataType,
+        CustomAnalyzer,
+    )
+
+    # Define a custom analyzer
+    custom_analyzer = CustomAnalyzer(
+        name="custom_analyzer",
+        tokenizer_name="microsoft_language_tokenizer",
+        token_filters=["lowercase"]
+    )
+
+    fields = [
+        SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+        SearchableField(
+            name="content",
+            type=SearchFieldDataType.String,
+            analyzer_name="custom_analyzer"
+        ),
+        SimpleField(name="sourcefile", type=SearchFieldDataType.String, filterable=True),
+        SimpleField(name="page", type=SearchFieldDataType.Int32),
+        SimpleField(name="chunk_id", type=SearchFieldDataType.Int32),
+    ]
+    
+    # Create the index with the custom analyzer
+    return SearchIndex(
+        name=index_name,
+        fields=fields,
+        analyzers=[custom_analyzer]
+    )
 
 def create_search_index(index_name):
     logging.info(f"Creating search index: {index_name}")
     try:
-        # Define a custom analyzer
-        custom_analyzer = CustomAnalyzer(
-            name="custom_analyzer",
-            tokenizer_name="microsoft_language_tokenizer",
-            token_filters=["lowercase"]
-        )
-
-        fields = [
-            SimpleField(name="id", type=SearchFieldDataType.String, key=True),
-            SearchableField(
-                name="content",
-                type=SearchFieldDataType.String,
-                analyzer_name="custom_analyzer"
-            ),
-        ]
-        
-        # Create the index with the custom analyzer
-        index = SearchIndex(
-            name=index_name,
-            fields=fields,
-            analyzers=[custom_analyzer]
-        )
-        result = search_index_client.create_or_update_index(index)
+        index = build_search_index(index_name)
+        result = get_search_index_client().create_or_update_index(index)
         logging.info(f"Search index '{index_name}' created successfully. Result: {result}")
     except Exception as e:
         logging.error(f"Error creating search index: {str(e)}")
         raise
 
+def index_exists(index_name):
+    from azure.core.exceptions import ResourceNotFoundError
+    try:
+        get_search_index_client().get_index(index_name)
+        return True
+    except ResourceNotFoundError:
+        return False
+
+def get_search_client(index_name):
+    """One SearchClient per index, shared by every upload and delete."""
+    return client_util.get_search_client(index_name, search_endpoint, search_key)
+
+def delete_chunks(index_name, chunk_ids):
+    """Delete documents from an index by key."""
+    if not chunk_ids:
+        return
+    logging.info(f"Deleting {len(chunk_ids)} stale documents from {index_name}")
+    result = get_search_client(index_name).delete_documents(documents=[{"id": chunk_id} for chunk_id in chunk_ids])
+    failed = [r.key for r in result if not r.succeeded]
+    if failed:
+        logging.warning(f"Failed to delete documents from {index_name}: {failed}")
+
 def encode_filename(filename):
     # Remove the .pdf extension, encode to bytes, then to base64, and decode to string
     return base64.urlsafe_b64encode(filename[:-4].encode()).decode()
 
-def read_pdf(file_path):
-    logging.info(f"Reading PDF file: {file_path}")
+def iter_pdf_pages(file_path, start=0, stop=None):
+    """
+    Yield the text of a PDF one page at a time.
+
+    Only the page being extracted is held in memory, so callers that chunk
+    and upload as they go never build the whole document text.
+
+    Args:
+        file_path (str): Path to the PDF.
+        start (int): First page index (0-based).
+        stop (int, optional): Page index to stop before; defaults to the last page.
+
+    Yields:
+        tuple: (page number, page text), with 1-based page numbers for citation.
+    """
+    import PyPDF2
     with open(file_path, 'rb') as file:
         pdf_reader = PyPDF2.PdfReader(file)
-        content = ""
-        for page in pdf_reader.pages:
-            content += page.extract_text()
-    return content.strip()
+        stop = len(pdf_reader.pages) if stop is None else min(stop, len(pdf_reader.pages))
+        for page in range(start, stop):
+            yield page + 1, pdf_reader.pages[page].extract_text() or ""
+
+def read_pdf(file_path):
+    logging.info(f"Reading PDF file: {file_path}")
+    with span("read_pdf", "ingestion", file=os.path.basename(file_path)) as current:
+        text = "".join(text for _, text in iter_pdf_pages(file_path)).strip()
+        current.set(chars=len(text))
+    return text
+
+def format_xlsx_row(row):
+    return " ".join(str(cell) for cell in row if cell is not None)
+
+def iter_xlsx_row_groups(file_path, rows_per_group=TABLE_ROWS_PER_GROUP):
+    """
+    Yield a workbook in groups of rows, streamed in read-only mode.
+
+    Every group starts with the sheet name and the sheet's header row (its
+    first non-empty row), so each chunk can be understood on its own.
+
+    Args:
+        file_path (str): Path to the XLSX file.
+        rows_per_group (int): Data rows per group.
+
+    Yields:
+        tuple: (group number, group text), with 1-based group numbers.
+    """
+    import openpyxl
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        group_number = 0
+        for worksheet in workbook.worksheets:
+            header = None
+            rows = []
+            sheet_groups = 0
+            for row in worksheet.iter_rows(values_only=True):
+                line = format_xlsx_row(row)
+                if not line:
+                    continue
+                if header is None:
+                    header = line
+                    continue
+                rows.append(line)
+                if len(rows) >= rows_per_group:
+                    group_number += 1
+                    sheet_groups += 1
+                    yield group_number, "\n".join([f"Sheet: {worksheet.title}", header] + rows)
+                    rows = []
+            # Flush the last rows, or the header alone for a sheet without data rows
+            if rows or (header is not None and sheet_groups == 0):
+                group_number += 1
+                yield group_number, "\n".join([f"Sheet: {worksheet.title}", header] + rows)
+    finally:
+        workbook.close()
+
+def iter_csv_row_groups(file_path, rows_per_group=TABLE_ROWS_PER_GROUP):
+    """
+    Yield a CSV file in groups of rows, parsed chunk by chunk.
+
+    Each group is rendered like DataFrame.to_string(), so the column header
+    is repeated per group and the row index keeps counting across groups.
+
+    Yields:
+        tuple: (group number, group text), with 1-based group numbers.
+    """
+    import pandas as pd
+    with pd.read_csv(file_path, chunksize=rows_per_group) as reader:
+        for group_number, chunk in enumerate(reader, start=1):
+            yield group_number, chunk.to_string()
 
 def read_xlsx(file_path):
     logging.info(f"Reading XLSX file: {file_path}")
-    workbook = openpyxl.load_workbook(file_path)
-    content = ""
-    for sheet in workbook.sheetnames:
-        worksheet = workbook[sheet]
-        for row in worksheet.iter_rows(values_only=True):
-            content += " ".join(str(cell) for cell in row if cell is not None) + "\n"
-    return content.strip()
+    with span("read_xlsx", "ingestion", file=os.path.basename(file_path)) as current:
+        text = "\n".join(text for _, text in iter_xlsx_row_groups(file_path)).strip()
+        current.set(chars=len(text))
+    return text
 
 def read_csv(file_path):
     logging.info(f"Reading CSV file: {file_path}")
-    df = pd.read_csv(file_path)
-    content = df.to_string()
-    return content.strip()
+    with span("read_csv", "ingestion", file=os.path.basename(file_path)) as current:
+        text = "\n".join(text for _, text in iter_csv_row_groups(file_path)).strip()
+        current.set(chars=len(text))
+    return text
+
+def count_pdf_pages(file_path):
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def read_pdf_pages(file_path, start, stop):
+    """Extract (page number, text) for pages [start, stop) of a PDF. Used as a process pool task."""
+    logging.info(f"Reading PDF pages {start + 1}-{stop} of {file_path}")
+    with span("read_pdf_pages", "ingestion", file=os.path.basename(file_path), first_page=start + 1) as current:
+        pages = list(iter_pdf_pages(file_path, start, stop))
+        current.set(pages=len(pages), chars=sum(len(text) for _, text in pages))
+    return pages
 
 # Add this new function to detect document type
 def get_document_type(filename):
@@ -118,54 +252,347 @@ def get_document_type(filename):
     else:
         raise ValueError(f"Unsupported file extension: {extension}")
 
-# Modify read_and_index_document to handle document type detection
-def read_and_index_document(index_name, document_file):
-    logging.info(f"Reading and indexing document for index {index_name}")
-    try:
-        file_path = os.path.join(DOCUMENT_DIR, document_file.strip())
-        logging.info(f"Reading file: {file_path}")
+def is_table_document(document_file):
+    """Whether a document is a spreadsheet or CSV that is indexed in row groups."""
+    return get_document_type(document_file) in TABLE_DOCUMENT_TYPES
+
+def read_document(document_file):
+    """Read the text content of a document in DOCUMENT_DIR, detecting its type."""
+    file_path = os.path.join(DOCUMENT_DIR, document_file.strip())
+    logging.info(f"Reading file: {file_path}")
+
+    document_type = get_document_type(document_file)
+
+    if document_type == 'pdf':
+        return read_pdf(file_path)
+    elif document_type == 'xlsx':
+        return read_xlsx(file_path)
+    elif document_type == 'csv':
+        return read_csv(file_path)
+    else:
+        raise ValueError(f"Unsupported document type: {document_type}")
+
+def iter_document_pages(document_file):
+    """
+    Yield (page number, text) for a document in DOCUMENT_DIR.
+
+    PDFs are streamed page by page and spreadsheets and CSVs in row groups,
+    where the group number takes the place of the page number.
+    """
+    file_path = os.path.join(DOCUMENT_DIR, document_file.strip())
+    logging.info(f"Streaming file: {file_path}")
+
+    document_type = get_document_type(document_file)
+    if document_type == 'pdf':
+        yield from iter_pdf_pages(file_path)
+    elif document_type == 'xlsx':
+        yield from iter_xlsx_row_groups(file_path)
+    elif document_type == 'csv':
+        yield from iter_csv_row_groups(file_path)
+    else:
+        yield 1, read_document(document_file)
+
+def read_document_pages(document_file):
+    """All (page number, text) pairs of a document. Used as a process pool task."""
+    with span("read_document_pages", "ingestion", file=document_file) as current:
+        pages = list(iter_document_pages(document_file))
+        current.set(pages=len(pages), chars=sum(len(text) for _, text in pages))
+    return pages
+
+def iter_cached_document_pages(document_file, content_hash, cache):
+    """
+    iter_document_pages backed by the extraction cache.
+
+    Cached pages are streamed from disk; otherwise the document is read and
+    its pages are stored in the cache as they are consumed.
+    """
+    pages = cache.iter_pages(content_hash)
+    if pages is not None:
+        logging.info(f"Using cached extraction of {document_file}")
+        return pages
+    return cache.write_through(content_hash, iter_document_pages(document_file))
+
+def find_chunk_end(text, start, chunk_size=CHUNK_SIZE):
+    """End offset of the chunk starting at `start`, preferring a sentence boundary."""
+    # Find the end of the chunk
+    end = start + chunk_size
+    
+    # If we're not at the end of the text, try to break at a sentence
+    if end < len(text):
+        # Look for sentence endings (.!?) within the last 100 characters of the chunk
+        last_period = text.rfind('.', end - 100, end)
+        last_exclaim = text.rfind('!', end - 100, end)
+        last_question = text.rfind('?', end - 100, end)
         
-        document_type = get_document_type(document_file)
+        # Find the latest sentence ending
+        break_point = max(last_period, last_exclaim, last_question)
         
-        if document_type == 'pdf':
-            content = read_pdf(file_path)
-        elif document_type == 'xlsx':
-            content = read_xlsx(file_path)
-        elif document_type == 'csv':
-            content = read_csv(file_path)
+        if break_point != -1:
+            end = break_point + 1
+        return end
+    return len(text)
+
+def chunk_pages(pages, join_pages=True, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Split a stream of pages into overlapping chunks as the pages arrive.
+
+    Only the text not yet chunked is buffered, so memory stays bounded by
+    about one page plus one chunk however long the document is. Chunks can
+    span page boundaries and are attributed to the page they start on.
+
+    Args:
+        pages (iterable): (page number, text) pairs in order.
+        join_pages (bool): Let chunks span pages. Disable for row groups of
+            spreadsheets and CSVs, which each carry their own header.
+        chunk_size (int): Approximate number of characters per chunk.
+        chunk_overlap (int): Number of characters shared by consecutive chunks.
+
+    Yields:
+        tuple: (page number, chunk text) for every non-empty chunk.
+    """
+    buffer = ""
+    buffer_offset = 0  # Offset of buffer[0] within the whole document
+    page_starts = []  # (offset, page number) of the pages overlapping the buffer
+
+    def page_at(offset):
+        while len(page_starts) > 1 and page_starts[1][0] <= offset:
+            page_starts.pop(0)
+        return page_starts[0][1]
+
+    def emit_chunks(final):
+        nonlocal buffer, buffer_offset
+        start = 0
+        # Until the last page is in, only cut chunks that end before the buffered text does
+        while (final and start < len(buffer)) or len(buffer) - start > chunk_size:
+            end = find_chunk_end(buffer, start, chunk_size)
+            chunk = buffer[start:end].strip()
+            if chunk:  # Only add non-empty chunks
+                yield page_at(buffer_offset + start), chunk
+            if end >= len(buffer):
+                start = end
+                break
+            # Move the start pointer, accounting for overlap
+            start = end - chunk_overlap
+        buffer = buffer[start:]
+        buffer_offset += start
+
+    for page_number, text in pages:
+        if not text:
+            continue
+        page_starts.append((buffer_offset + len(buffer), page_number))
+        buffer += text
+        yield from emit_chunks(final=not join_pages)
+    yield from emit_chunks(final=True)
+
+def split_row_group(text, chunk_size=CHUNK_SIZE):
+    """
+    Split a row group into chunks of whole rows of about chunk_size characters.
+
+    Every chunk starts with the group's header lines (the "Sheet:" line and
+    header row of a workbook, or the column header of a CSV), so each can be
+    understood on its own. A single row longer than chunk_size is its own chunk.
+    """
+    lines = text.split("\n")
+    header_count = 2 if lines[0].startswith("Sheet: ") else 1
+    header, rows = lines[:header_count], lines[header_count:]
+    header_size = sum(len(line) + 1 for line in header)
+
+    chunk, size = [], header_size
+    for row in rows:
+        if chunk and size + len(row) + 1 > chunk_size:
+            yield "\n".join(header + chunk)
+            chunk, size = [], header_size
+        chunk.append(row)
+        size += len(row) + 1
+    if chunk or not rows:
+        yield "\n".join(header + chunk)
+
+def chunk_row_groups(groups, chunk_size=CHUNK_SIZE):
+    """
+    Split a stream of row groups into chunks that repeat the header lines.
+
+    Yields:
+        tuple: (group number, chunk text) for every chunk.
+    """
+    for group_number, text in groups:
+        if text:
+            for chunk in split_row_group(text, chunk_size):
+                yield group_number, chunk
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Split text into smaller chunks with overlap."""
+    return [chunk for _, chunk in chunk_pages([(1, text)], True, chunk_size, chunk_overlap)]
+
+def plan_extraction_tasks(document_files):
+    """
+    Split documents into extraction tasks.
+
+    Large PDFs are split into ranges of PDF_PAGES_PER_TASK pages so a single
+    manual is extracted on several cores; other documents are one task each.
+
+    Returns:
+        list: (document_file, part, function, args) tuples.
+    """
+    tasks = []
+    for document_file in document_files:
+        file_path = os.path.join(DOCUMENT_DIR, document_file.strip())
+        if get_document_type(document_file) == 'pdf':
+            page_count = count_pdf_pages(file_path)
+            for part, start in enumerate(range(0, page_count, PDF_PAGES_PER_TASK)):
+                tasks.append((document_file, part, read_pdf_pages, (file_path, start, min(start + PDF_PAGES_PER_TASK, page_count))))
+            if page_count == 0:
+                tasks.append((document_file, 0, read_document_pages, (document_file,)))
         else:
-            raise ValueError(f"Unsupported document type: {document_type}")
-        
-        encoded_filename = encode_filename(document_file)
-        document = {
-            "id": encoded_filename,
-            "content": content
+            tasks.append((document_file, 0, read_document_pages, (document_file,)))
+    return tasks
+
+def extract_documents(document_files, max_workers=MAX_EXTRACTION_WORKERS, max_in_flight=None):
+    """
+    Extract documents in a process pool and yield them as they complete.
+
+    At most max_in_flight tasks are submitted at a time, which bounds the
+    extracted text held in memory while the caller uploads.
+
+    Args:
+        document_files (list): Document file names in DOCUMENT_DIR.
+        max_workers (int): Extraction processes.
+        max_in_flight (int, optional): Submitted but unconsumed tasks (default: 2 per worker).
+
+    Yields:
+        tuple: (document_file, pages) in completion order, where pages are
+        the document's (page number, text) pairs in page order.
+    """
+    tasks = plan_extraction_tasks(document_files)
+    remaining_parts = {}
+    for document_file, _, _, _ in tasks:
+        remaining_parts[document_file] = remaining_parts.get(document_file, 0) + 1
+    logging.info(f"Extracting {len(remaining_parts)} documents as {len(tasks)} tasks on {max_workers} processes")
+
+    max_in_flight = max_in_flight or 2 * max_workers
+    parts = {}
+    pending = {}
+    task_iter = iter(tasks)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            for document_file, part, function, args in task_iter:
+                pending[executor.submit(function, *args)] = (document_file, part)
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                document_file, part = pending.pop(future)
+                parts.setdefault(document_file, {})[part] = future.result()
+                remaining_parts[document_file] -= 1
+                if remaining_parts[document_file] == 0:
+                    document_parts = parts.pop(document_file)
+                    pages = [page for i in sorted(document_parts) for page in document_parts[i]]
+                    logging.info(f"Extracted {document_file} ({len(pages)} pages)")
+                    yield document_file, pages
+
+def extract_documents_cached(document_files, document_hashes, cache, max_workers=MAX_EXTRACTION_WORKERS):
+    """
+    extract_documents backed by the extraction cache.
+
+    Cached documents are yielded first without starting any extraction;
+    the rest are extracted in the process pool and added to the cache.
+
+    Args:
+        document_files (list): Document file names in DOCUMENT_DIR.
+        document_hashes (dict): Content hash of every document.
+        cache (ExtractionCache): Cache of extracted pages.
+        max_workers (int): Extraction processes.
+
+    Yields:
+        tuple: (document_file, pages) as in extract_documents.
+    """
+    missing = []
+    for document_file in document_files:
+        with span("read_extraction_cache", "ingestion", file=document_file) as current:
+            pages = cache.get(document_hashes[document_file])
+            current.set(cache_hit=pages is not None, pages=len(pages or []))
+        if pages is None:
+            missing.append(document_file)
+            continue
+        logging.info(f"Using cached extraction of {document_file}")
+        yield document_file, pages
+
+    if not missing:
+        return
+    for document_file, pages in extract_documents(missing, max_workers):
+        cache.put(document_hashes[document_file], pages)
+        yield document_file, pages
+
+def build_documents(document_file, content):
+    """
+    Search documents for the content of one file, one per chunk.
+
+    The content is extracted text or a stream of (page, text) pairs from
+    iter_document_pages. Text is split into overlapping chunks of about
+    CHUNK_SIZE characters, each citing the page it starts on, so a search
+    hit returns the matching section instead of the whole manual. Row
+    groups of spreadsheets and CSVs are already sized and carry their
+    header, so each group is one chunk. Their group numbers are not pages,
+    so table chunks are stored without a page and cited by file only.
+    """
+    if isinstance(content, str):
+        content = [(1, content)]
+    table = is_table_document(document_file)
+    chunks = content if table else chunk_pages(content)
+    for chunk_id, (page, chunk) in enumerate(chunks):
+        yield {
+            "id": f"{encode_filename(document_file)}_{chunk_id}",
+            "content": chunk,
+            "sourcefile": document_file,
+            "page": None if table else page,
+            "chunk_id": chunk_id
         }
-        
-        logging.info(f"Successfully read file: {document_file} (encoded as: {encoded_filename})")
-    
-        # Initialize SearchClient for this specific index
-        search_client = SearchClient(endpoint=search_endpoint, 
-                                   index_name=index_name, 
-                                   credential=search_credential, 
-                                   api_version="2023-10-01-Preview")
-        
-        logging.info(f"Attempting to index document for {index_name}")
-        result = search_client.upload_documents([document])
-        succeeded = sum(1 for r in result if r.succeeded)
-        failed = sum(1 for r in result if not r.succeeded)
-        logging.info(f"Indexing complete for {index_name}. Succeeded: {succeeded}, Failed: {failed}")
-        if failed > 0:
-            logging.warning(f"Document failed to index for {index_name}. Check individual results for details.")
-        
-        return search_client
+
+def index_document(index_name, document_file, content, uploader=None, local_documents=None):
+    """
+    Upload the extracted content of one document to an index.
+
+    The content is either extracted text or a (page, text) stream from
+    iter_document_pages, and is uploaded in chunks (see build_documents).
+    With an uploader the documents are only queued on
+    it and sent with the uploader's next batch; otherwise they are uploaded
+    immediately. When `local_documents` is a list, the documents are also
+    appended to it for the local BM25 index.
+
+    Returns:
+        list: Ids of the chunks queued or uploaded.
+    """
+    from utils.search_upload_util import BatchUploader
+    logging.info(f"Indexing document {document_file} for index {index_name}")
+    try:
+        own_uploader = uploader is None
+        if own_uploader:
+            uploader = BatchUploader(get_search_client(index_name))
+
+        document_ids = []
+        for document in build_documents(document_file, content):
+            uploader.add(document)
+            if local_documents is not None:
+                local_documents.append(document)
+            document_ids.append(document["id"])
+
+        if own_uploader:
+            report = uploader.close()
+            logging.info(f"Indexing complete for {index_name}. Succeeded: {report['succeeded']}, Failed: {len(report['failed'])}")
+        return document_ids
     except Exception as e:
-        logging.error(f"Error in read_and_index_document for {index_name}: {str(e)}")
+        logging.error(f"Error in index_document for {index_name}: {str(e)}")
         raise
 
+def read_and_index_document(index_name, document_file):
+    logging.info(f"Reading and indexing document for index {index_name}")
+    return index_document(index_name, document_file, iter_document_pages(document_file))
+
 def delete_index_if_exists(index_name):
     try:
-        search_index_client.delete_index(index_name)
+        get_search_index_client().delete_index(index_name)
         logging.info(f"Existing index '{index_name}' deleted successfully.")
     except Exception as e:
         if "ResourceNotFound" not in str(e):
@@ -174,7 +601,69 @@ def delete_index_if_exists(index_name):
         else:
             logging.info(f"Index '{index_name}' does not exist. Proceeding with creation.")
 
+def prepare_index(index_name, document_list, document_hashes, incremental):
+    """
+    Bring an index and its manifest to the state needed for this run.
+
+    In incremental mode an existing index with an unchanged schema is kept:
+    chunks of documents that were removed from the config are deleted and
+    only new or changed documents are returned for processing. Otherwise the
+    index is recreated and every document is returned.
+
+    Returns:
+        tuple: (manifest, documents to process)
+    """
+    manifest = IndexManifest.load(index_name)
+    schema_hash = hash_schema(build_search_index(index_name))
+
+    if incremental and manifest.schema_hash == schema_hash and index_exists(index_name):
+        removed = manifest.removed_documents(document_list)
+        delete_chunks(index_name, [chunk_id for document in removed for chunk_id in manifest.chunk_ids(document)])
+        for document in removed:
+            manifest.forget(document)
+        changed = manifest.changed_documents({document: document_hashes[document] for document in document_list})
+        logging.info(f"Index {index_name}: {len(changed)} new or changed, {len(removed)} removed, "
+                     f"{len(document_list) - len(changed)} unchanged documents")
+    else:
+        if incremental:
+            logging.info(f"Index {index_name} is missing or its schema changed, rebuilding it")
+
+        # Delete existing index if it exists
+        delete_index_if_exists(index_name)
+
+        # Create search index
+        create_search_index(index_name)
+        manifest.reset(schema_hash)
+        changed = list(document_list)
+
+    manifest.save()
+    return manifest, changed
+
+def update_keyword_index(index_name, document_list, changed, documents):
+    """
+    Rebuild the local BM25 index of a search index after an upload run.
+
+    Documents of unchanged files are carried over from the previous local
+    index; `documents` are those uploaded for the changed files in this run.
+    """
+    from utils.bm25_index_util import BM25Index
+    carried = []
+    if BM25Index.exists(index_name):
+        previous = BM25Index.load(index_name)
+        unchanged = set(document_list) - set(changed)
+        carried = [document for document in previous.documents if document.get("sourcefile") in unchanged]
+        if not documents and len(carried) == len(previous):
+            return
+    BM25Index.build(index_name, carried + documents).save()
+
 def main():
+    parser = argparse.ArgumentParser(description="Create the search indexes and upload their documents.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep existing indexes and only re-process new, changed or removed documents")
+    args = parser.parse_args()
+    from utils.search_upload_util import BatchUploader
+    from utils.bm25_index_util import BM25Index
+
     logging.info("Starting the index creation and document upload process")
 
     try:
@@ -182,33 +671,75 @@ def main():
         with open(CONFIG_FILE, 'r') as config_file:
             index_config = json.load(config_file)
         
+        # Prepare every index and note which indexes each document must be uploaded to
+        document_hashes = {}
+        document_indexes = {}
+        manifests = {}
+        index_changes = {}
         for _, index_data in index_config.items():
             index_name = index_data['index_name']
             document_list = [doc.strip() for doc in index_data['document_list'].split(',')]
             logging.info(f"Processing index: {index_name} with documents: {document_list}")
 
-            # Delete existing index if it exists
-            delete_index_if_exists(index_name)
+            for document_file in document_list:
+                if document_file not in document_hashes:
+                    document_hashes[document_file] = hash_file(os.path.join(DOCUMENT_DIR, document_file))
 
-            # Create search index
-            create_search_index(index_name)
+            manifests[index_name], changed = prepare_index(index_name, document_list, document_hashes, args.incremental)
+            if not BM25Index.exists(index_name) and len(changed) < len(document_list):
+                logging.info(f"Local BM25 index for {index_name} is missing, re-processing all documents")
+                changed = list(document_list)
+            index_changes[index_name] = (document_list, changed)
+            for document_file in changed:
+                document_indexes.setdefault(document_file, []).append(index_name)
 
-            # Read and index each document
-            search_client = None
-            for document_file in document_list:
-                search_client = read_and_index_document(index_name, document_file)
-
-            # Check final document count
-            if search_client:
-                for i in range(5):
-                    total_docs = search_client.get_document_count()
-                    logging.info(f"Attempt {i+1}: Total documents in index {index_name}: {total_docs}")
-                    if total_docs == len(document_list):
-                        break
-                    time.sleep(5)
-
-                if total_docs != len(document_list):
-                    logging.warning(f"Expected {len(document_list)} documents in index {index_name}, but found {total_docs}")
+        # Extract each distinct document once, in parallel, and queue it for upload as soon as it is ready.
+        # Spreadsheets and CSVs are streamed in row groups instead, one search document per group.
+        uploaders = {}
+        uploaded = {}
+        local_documents = {index_name: [] for index_name in index_changes}
+        if document_indexes:
+            # Unchanged files are served from the extraction cache without being parsed again
+            cache = ExtractionCache()
+            table_documents = [document_file for document_file in document_indexes if is_table_document(document_file)]
+            extracted = extract_documents_cached([document_file for document_file in document_indexes if document_file not in table_documents],
+                                                 document_hashes, cache)
+            streamed = ((document_file, None) for document_file in table_documents)
+            for document_file, content in itertools.chain(extracted, streamed):
+                for index_name in document_indexes[document_file]:
+                    if index_name not in uploaders:
+                        uploaders[index_name] = BatchUploader(get_search_client(index_name))
+                    if content is None:
+                        document_content = iter_cached_document_pages(document_file, document_hashes[document_file], cache)
+                    else:
+                        document_content = content
+                    chunk_ids = index_document(index_name, document_file, document_content, uploaders[index_name],
+                                               local_documents[index_name])
+                    uploaded.setdefault(index_name, []).append((document_file, chunk_ids))
+        else:
+            logging.info("All indexes are up to date")
+
+        # Wait for the uploads and only record documents whose chunks all succeeded
+        for index_name, uploader in uploaders.items():
+            report = uploader.close()
+            logging.info(f"Indexing complete for {index_name}. Succeeded: {report['succeeded']}, "
+                         f"Failed: {len(report['failed'])}, Batches: {report['batches']}, "
+                         f"Retried: {report['retried']}, Elapsed: {report['elapsed']}s")
+
+            manifest = manifests[index_name]
+            for document_file, chunk_ids in uploaded[index_name]:
+                if any(chunk_id in report['failed'] for chunk_id in chunk_ids):
+                    logging.warning(f"Document {document_file} failed to index for {index_name}: "
+                                    f"{[report['failed'][chunk_id] for chunk_id in chunk_ids if chunk_id in report['failed']]}")
+                    manifest.mark_failed(document_file, chunk_ids)
+                    continue
+                delete_chunks(index_name, [chunk_id for chunk_id in manifest.chunk_ids(document_file) if chunk_id not in chunk_ids])
+                manifest.record(document_file, document_hashes[document_file], chunk_ids)
+            manifest.save()
+
+        # Keep the local BM25 indexes in step with the uploaded documents
+        for index_name, (document_list, changed) in index_changes.items():
+            update_keyword_index(index_name, document_list, changed, local_documents[index_name])
 
         logging.info("Index creation and document upload complete for all indices.")
     except Exception as e:
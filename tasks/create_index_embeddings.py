@@ -1,227 +1,551 @@
 import os
+import sys
 import json
 import logging
+import asyncio
+import argparse
 import numpy as np
-from typing import List, Dict
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Dict, Iterable, Iterator, Tuple, Union
+from azure.search.documents.models import VectorizedQuery
 from azure.search.documents.indexes.models import (
     SearchIndex,
+    SearchField,
     SimpleField,
     SearchableField,
     SearchFieldDataType,
     VectorSearch,
-    HnswVectorSearchAlgorithmConfiguration,
+    HnswAlgorithmConfiguration,
+    HnswParameters,
     VectorSearchProfile,
-    VectorSearchField,
 )
-import openai
-from tenacity import retry, wait_random_exponential, stop_after_attempt
+
+# Add the parent directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from tasks.create_index import (
+    CONFIG_FILE,
+    DOCUMENT_DIR,
+    get_search_index_client,
+    search_endpoint,
+    search_key,
+    encode_filename,
+    iter_cached_document_pages,
+    chunk_pages,
+    chunk_row_groups,
+    is_table_document,
+    delete_index_if_exists,
+    delete_chunks,
+    index_exists,
+    get_search_client,
+    update_keyword_index,
+)
+from utils.index_manifest_util import IndexManifest, hash_file, hash_schema
+from utils.search_upload_util import BatchUploader
+from utils.extraction_cache_util import ExtractionCache
+from utils.rate_limit_util import TokenRateLimiter
+from utils.embedding_store_util import EmbeddingStore
+from utils.vector_index_util import LocalVectorIndex, VECTOR_DTYPES, DEFAULT_VECTOR_DTYPE
+from utils.bm25_index_util import BM25Index, reciprocal_rank_fusion
+from utils.chat_chunker_util import count_tokens
+from utils.client_util import (get_openai_client, create_async_openai_client, create_async_search_client,
+                               search_in_filter, with_retries)
+from utils.trace_util import span
 
 # Add new constants
-CHUNK_SIZE = 1000  # Approximate number of characters per chunk
-CHUNK_OVERLAP = 100  # Number of characters to overlap between chunks
+CHUNK_SIZE = 1000  # Approximate number of characters per embedded chunk
+CHUNK_OVERLAP = 100  # Number of characters to overlap between embedded chunks
 EMBEDDING_MODEL = "text-embedding-ada-002"  # OpenAI embedding model to use
 EMBEDDING_DIMENSION = 1536  # OpenAI ada-002 embedding dimension
 MAX_TOKENS_PER_CHUNK = 8191  # OpenAI's token limit for text-embedding-ada-002
+EMBEDDING_BATCH_TOKENS = 100_000  # Token budget of one multi-input embedding request
+EMBEDDING_BATCH_INPUTS = 2048  # OpenAI's limit on inputs per embedding request
+MAX_CONCURRENT_EMBEDDING_REQUESTS = 4  # Embedding requests in flight at the same time
+EMBEDDING_TOKENS_PER_MINUTE = 1_000_000  # Token budget shared by all embedding requests
+SEARCH_TIMEOUT = 10.0  # Seconds allowed per index in multi_index_search
+# Errors that no index can recover from, e.g. a missing SDK transport or endpoint; raised instead of skipping the index
+SEARCH_SETUP_ERRORS = (ImportError, ValueError, TypeError)
+SEARCH_FIELDS = ["id", "content", "sourcefile", "page", "chunk_id"]
 
-def create_search_index(index_name: str):
-    """Create search index with vector search capability."""
-    try:
-        # Define vector search configuration
-        vector_search = VectorSearch(
-            algorithms=[
-                HnswVectorSearchAlgorithmConfiguration(
-                    name="hnsw-config",
-                    parameters={
-                        "m": 4,
-                        "efConstruction": 400,
-                        "efSearch": 500,
-                        "metric": "cosine"
-                    }
-                )
-            ],
-            profiles=[
-                VectorSearchProfile(
-                    name="vector-profile",
-                    algorithm_configuration_name="hnsw-config",
-                )
-            ]
-        )
+# Shared by every document embedded in this process
+embedding_rate_limiter = TokenRateLimiter(EMBEDDING_TOKENS_PER_MINUTE)
 
-        # Define fields including vector field for embeddings
-        fields = [
-            SimpleField(name="id", type=SearchFieldDataType.String, key=True),
-            SearchableField(name="content", type=SearchFieldDataType.String),
-            SimpleField(name="sourcefile", type=SearchFieldDataType.String),
-            SimpleField(name="chunk_id", type=SearchFieldDataType.Int32),
-            VectorSearchField(
-                name="content_vector",
-                type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
-                dimension=EMBEDDING_DIMENSION,
-                vector_search_profile_name="vector-profile"
+def build_search_index(index_name: str) -> SearchIndex:
+    """Define the search index with vector search capability."""
+    # Define vector search configuration
+    vector_search = VectorSearch(
+        algorithms=[
+            HnswAlgorithmConfiguration(
+                name="hnsw-config",
+                parameters=HnswParameters(
+                    m=4,
+                    ef_construction=400,
+                    ef_search=500,
+                    metric="cosine"
+                )
+            )
+        ],
+        profiles=[
+            VectorSearchProfile(
+                name="vector-profile",
+                algorithm_configuration_name="hnsw-config",
             )
         ]
-        
-        index = SearchIndex(
-            name=index_name,
-            fields=fields,
-            vector_search=vector_search
+    )
+
+    # Define fields including vector field for embeddings
+    fields = [
+        SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+        SearchableField(name="content", type=SearchFieldDataType.String),
+        SimpleField(name="sourcefile", type=SearchFieldDataType.String, filterable=True),
+        SimpleField(name="page", type=SearchFieldDataType.Int32),
+        SimpleField(name="chunk_id", type=SearchFieldDataType.Int32),
+        SearchField(
+            name="content_vector",
+            type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+            searchable=True,
+            vector_search_dimensions=EMBEDDING_DIMENSION,
+            vector_search_profile_name="vector-profile"
         )
-        
-        result = search_index_client.create_or_update_index(index)
+    ]
+    
+    return SearchIndex(
+        name=index_name,
+        fields=fields,
+        vector_search=vector_search
+    )
+
+def create_search_index(index_name: str):
+    """Create search index with vector search capability."""
+    try:
+        index = build_search_index(index_name)
+        result = get_search_index_client().create_or_update_index(index)
         logging.info(f"Search index '{index_name}' created successfully")
         return result
     except Exception as e:
         logging.error(f"Error creating search index: {str(e)}")
         raise
 
-def chunk_text(text: str) -> List[str]:
-    """Split text into smaller chunks with overlap."""
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        # Find the end of the chunk
-        end = start + CHUNK_SIZE
-        
-        # If we're not at the end of the text, try to break at a sentence
-        if end < len(text):
-            # Look for sentence endings (.!?) within the last 100 characters of the chunk
-            last_period = text.rfind('.', end - 100, end)
-            last_exclaim = text.rfind('!', end - 100, end)
-            last_question = text.rfind('?', end - 100, end)
-            
-            # Find the latest sentence ending
-            break_point = max(last_period, last_exclaim, last_question)
-            
-            if break_point != -1:
-                end = break_point + 1
-        else:
-            end = len(text)
-        
-        # Extract the chunk
-        chunk = text[start:end].strip()
-        if chunk:  # Only add non-empty chunks
-            chunks.append(chunk)
-        
-        # Move the start pointer, accounting for overlap
-        start = end - CHUNK_OVERLAP
-    
-    return chunks
+@lru_cache(maxsize=None)
+def get_embedding_store() -> EmbeddingStore:
+    return EmbeddingStore(EMBEDDING_MODEL, EMBEDDING_DIMENSION)
+
+@with_retries
+def request_embeddings(texts: List[str]) -> List[List[float]]:
+    """Get the embeddings of several texts in one OpenAI API request, retrying throttled and failed requests."""
+    with span("request_embeddings", "embedding", texts=len(texts), chars=sum(len(text) for text in texts)) as current:
+        response = get_openai_client().embeddings.create(
+            input=texts,
+            model=EMBEDDING_MODEL
+        )
+        current.set(tokens=response.usage.total_tokens)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Get the embeddings of several texts, requesting only those not in the embedding store.
+
+    Embeddings from the API are added to the store, so unchanged chunks and
+    repeated queries are never embedded twice.
+    """
+    with span("get_embeddings", "embedding", texts=len(texts)) as current:
+        store = get_embedding_store()
+        embeddings = store.get_many(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        current.set(cache_hits=len(texts) - len(missing), requested=len(missing))
+        if missing:
+            fetched = request_embeddings([texts[i] for i in missing])
+            store.put_many([texts[i] for i in missing], fetched)
+            for i, embedding in zip(missing, fetched):
+                embeddings[i] = embedding
+    return [embedding.tolist() if isinstance(embedding, np.ndarray) else embedding for embedding in embeddings]
 
-@retry(wait=wait_random_exponential(min=1, max=20), stop=stop_after_attempt(3))
 def get_embedding(text: str) -> List[float]:
     """Get embedding from OpenAI API with retry logic."""
-    response = openai.Embedding.create(
-        input=text,
-        model=EMBEDDING_MODEL
-    )
-    return response['data'][0]['embedding']
+    return get_embeddings([text])[0]
+
+async def get_query_embedding(query: str) -> List[float]:
+    """
+    Embedding of a search query without blocking the event loop.
+
+    Served from the embedding store when the query was embedded before,
+    otherwise requested with the async OpenAI client, whose own retries
+    honor Retry-After, and stored.
+    """
+    with span("get_query_embedding", "embedding", query_chars=len(query)) as current:
+        store = get_embedding_store()
+        embedding = store.get(query)
+        current.set(cache_hits=int(embedding is not None))
+        if embedding is not None:
+            return embedding.tolist()
+        async with create_async_openai_client() as client:
+            response = await client.embeddings.create(input=[query], model=EMBEDDING_MODEL)
+        current.set(tokens=response.usage.total_tokens)
+        embedding = response.data[0].embedding
+        store.put_many([query], [embedding])
+        return embedding
+
+def batch_by_tokens(items: Iterable[Any], text: Callable[[Any], str],
+                    max_tokens: int = EMBEDDING_BATCH_TOKENS,
+                    max_inputs: int = EMBEDDING_BATCH_INPUTS) -> Iterator[Tuple[List[Any], int]]:
+    """
+    Group items into embedding requests bounded by total tokens and input count.
+
+    Texts already in the embedding store count as zero tokens, since they
+    are served without calling the API.
+
+    Yields:
+        Tuple[List[Any], int]: The items of one request and their token count.
+    """
+    store = get_embedding_store()
+    batch, batch_tokens = [], 0
+    for item in items:
+        item_text = text(item)
+        tokens = 0 if item_text in store else min(count_tokens(item_text, EMBEDDING_MODEL), MAX_TOKENS_PER_CHUNK)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+            yield batch, batch_tokens
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch, batch_tokens
+
+def embed_batches(items: Iterable[Any], text: Callable[[Any], str] = lambda item: item,
+                  max_concurrency: int = MAX_CONCURRENT_EMBEDDING_REQUESTS,
+                  rate_limiter: TokenRateLimiter = None) -> Iterator[Tuple[Any, List[float]]]:
+    """
+    Embed a stream of items with batched, concurrent requests.
+
+    Items are grouped by batch_by_tokens and the requests run on a small
+    thread pool, each waiting for its tokens from the rate limiter. Results
+    are yielded in input order, and at most twice max_concurrency requests
+    are pending, so long documents are embedded in bounded memory.
+
+    Args:
+        items (Iterable[Any]): Items to embed, e.g. (page, chunk) pairs.
+        text (Callable[[Any], str]): Returns the text to embed for an item.
+        max_concurrency (int): Embedding requests in flight.
+        rate_limiter (TokenRateLimiter, optional): Defaults to the process-wide limiter.
+
+    Yields:
+        Tuple[Any, List[float]]: Each item with its embedding.
+    """
+    rate_limiter = rate_limiter or embedding_rate_limiter
+
+    def embed(batch, batch_tokens):
+        if batch_tokens:
+            rate_limiter.acquire(batch_tokens)
+        return get_embeddings([text(item) for item in batch])
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for batch, batch_tokens in batch_by_tokens(items, text):
+            pending.append((batch, executor.submit(embed, batch, batch_tokens)))
+            if len(pending) >= 2 * max_concurrency:
+                batch, future = pending.popleft()
+                yield from zip(batch, future.result())
+        while pending:
+            batch, future = pending.popleft()
+            yield from zip(batch, future.result())
 
-def read_and_index_document(index_name: str, document_file: str, document_content: str):
-    """Read document, chunk it, get embeddings, and index in Azure Search."""
+def read_and_index_document(index_name: str, document_file: str,
+                            document_content: Union[str, Iterable[Tuple[int, str]]],
+                            uploader: BatchUploader = None, join_pages: bool = True,
+                            local_index: LocalVectorIndex = None,
+                            local_documents: List[Dict] = None) -> List[str]:
+    """
+    Read document, chunk it, get embeddings, and index in Azure Search.
+
+    The content may be the document text or a stream of (page number, text)
+    pages, e.g. from iter_document_pages, which is chunked and uploaded as
+    it is read; see chunk_pages for `join_pages`. Without join_pages the
+    pages are taken as row groups of a spreadsheet or CSV and split into
+    whole rows, each chunk repeating the group's header lines (see
+    chunk_row_groups) and stored without a page, since group numbers are
+    not pages. Chunks are queued on
+    `uploader` when given, otherwise uploaded with a dedicated uploader
+    before returning. They are also added to `local_index` when given, and
+    appended without their vector to `local_documents` when it is a list,
+    for the local BM25 index of the same chunks.
+
+    Returns:
+        List[str]: Ids of the chunks queued or uploaded.
+    """
     try:
-        # Split content into chunks
-        chunks = chunk_text(document_content)
-        logging.info(f"Split document into {len(chunks)} chunks")
+        if isinstance(document_content, str):
+            document_content = [(1, document_content)]
+
+        own_uploader = uploader is None
+        if own_uploader:
+            uploader = BatchUploader(get_search_client(index_name))
         
-        # Initialize SearchClient for this specific index
-        search_client = SearchClient(
-            endpoint=search_endpoint,
-            index_name=index_name,
-            credential=search_credential,
-            api_version="2023-10-01-Preview"
-        )
+        # Chunks are embedded in batched requests, in order, while later pages are still being read
+        if join_pages:
+            chunks = chunk_pages(document_content, True, CHUNK_SIZE, CHUNK_OVERLAP)
+        else:
+            chunks = chunk_row_groups(document_content, CHUNK_SIZE)
+        chunk_ids = []
+        for chunk_id, ((page, chunk), embedding) in enumerate(embed_batches(chunks, text=lambda item: item[1])):
+            # Create document
+            document = {
+                "id": f"{encode_filename(document_file)}_{chunk_id}",
+                "content": chunk,
+                "sourcefile": document_file,
+                "page": page if join_pages else None,
+                "chunk_id": chunk_id,
+                "content_vector": embedding
+            }
+            uploader.add(document)
+            if local_index is not None:
+                local_index.add(document)
+            if local_documents is not None:
+                local_documents.append({field: value for field, value in document.items() if field != "content_vector"})
+            chunk_ids.append(document["id"])
+        logging.info(f"Split {document_file} into {len(chunk_ids)} chunks")
         
-        # Process and upload chunks in batches
-        batch_size = 10
-        for i in range(0, len(chunks), batch_size):
-            batch_chunks = chunks[i:i + batch_size]
-            documents = []
-            
-            for chunk_id, chunk in enumerate(batch_chunks, start=i):
-                # Get embedding for the chunk
-                embedding = get_embedding(chunk)
-                
-                # Create document
-                document = {
-                    "id": f"{encode_filename(document_file)}_{chunk_id}",
-                    "content": chunk,
-                    "sourcefile": document_file,
-                    "chunk_id": chunk_id,
-                    "content_vector": embedding
-                }
-                documents.append(document)
-            
-            # Upload batch
-            result = search_client.upload_documents(documents)
-            succeeded = sum(1 for r in result if r.succeeded)
-            failed = sum(1 for r in result if not r.succeeded)
-            logging.info(f"Batch indexing complete. Succeeded: {succeeded}, Failed: {failed}")
+        if own_uploader:
+            report = uploader.close()
+            logging.info(f"Indexing complete. Succeeded: {report['succeeded']}, Failed: {len(report['failed'])}")
         
-        return search_client
+        return chunk_ids
     except Exception as e:
         logging.error(f"Error in read_and_index_document for {index_name}: {str(e)}")
         raise
 
-async def semantic_search(index_name: str, query: str, top_k: int = 3):
-    """Perform semantic search using embeddings."""
+@lru_cache(maxsize=None)
+def get_local_index(index_name: str) -> LocalVectorIndex:
+    return LocalVectorIndex.load(index_name)
+
+def local_search(index_name: str, query_embedding: List[float], top_k: int, sourcefiles: List[str] = None) -> List[Dict]:
+    return get_local_index(index_name).search([query_embedding], top_k, sourcefiles)[0]
+
+def format_search_result(doc: Dict) -> Dict:
+    return {"id": doc.get("id"),
+            "content": doc["content"],
+            "score": doc["score"] if "score" in doc else doc["@search.score"],
+            "source": doc["sourcefile"],
+            "page": doc.get("page"),
+            "chunk_id": doc.get("chunk_id")}
+
+async def semantic_search(index_name: str, query: str, top_k: int = 3,
+                          sourcefiles: List[str] = None, local_first: bool = True,
+                          query_embedding: List[float] = None):
+    """
+    Perform semantic search using embeddings.
+
+    The local vector index written by main() is searched first when it
+    exists, avoiding the round trip to Azure AI Search and allowing retrieval
+    without access to the search service. Local scores are cosine
+    similarities; Azure scores are the service's relevance scores. The
+    local lookup runs in a worker thread and the Azure query uses the async
+    search client, so concurrent searches overlap instead of blocking the
+    event loop.
+
+    Args:
+        index_name (str): Embeddings index to search.
+        query (str): Search query.
+        top_k (int): Number of results.
+        sourcefiles (List[str], optional): Only return chunks of these documents.
+        local_first (bool): Use the local vector index when available.
+        query_embedding (List[float], optional): Embedding of the query, if already known.
+    """
     try:
-        search_client = SearchClient(
-            endpoint=search_endpoint,
-            index_name=index_name,
-            credential=search_credential,
-            api_version="2023-10-01-Preview"
-        )
-        
-        # Get query embedding
-        query_embedding = get_embedding(query)
-        
-        # Perform vector search
-        results = search_client.search(
-            search_text=None,
-            vector=query_embedding,
-            vector_fields="content_vector",
-            select=["content", "sourcefile", "chunk_id"],
-            top=top_k
-        )
-        
-        return [{"content": doc["content"], 
-                "score": doc["@search.score"],
-                "source": doc["sourcefile"],
-                "chunk_id": doc["chunk_id"]} 
-                for doc in results]
+        if query_embedding is None:
+            query_embedding = await get_query_embedding(query)
+
+        with span("semantic_search", "retrieval", index=index_name, top_k=top_k) as current:
+            if local_first and LocalVectorIndex.exists(index_name):
+                current.set(source="local")
+                # Loading and scanning the index is CPU work; a thread keeps concurrent searches and timeouts working
+                hits = await asyncio.to_thread(local_search, index_name, query_embedding, top_k, sourcefiles)
+                return [format_search_result(doc) for doc in hits]
+
+            current.set(source="azure")
+            async with create_async_search_client(index_name, search_endpoint, search_key) as search_client:
+                # Perform vector search
+                results = await search_client.search(
+                    search_text=None,
+                    vector_queries=[VectorizedQuery(vector=query_embedding, k_nearest_neighbors=top_k,
+                                                    fields="content_vector")],
+                    select=SEARCH_FIELDS,
+                    filter=search_in_filter("sourcefile", sourcefiles) if sourcefiles else None,
+                    top=top_k
+                )
+                return [format_search_result(doc) async for doc in results]
     except Exception as e:
         logging.error(f"Error in semantic search: {str(e)}")
         raise
 
+async def multi_index_search(index_names: List[str], query: str, top_k: int = 3,
+                             sourcefiles: List[str] = None, timeout: float = SEARCH_TIMEOUT):
+    """
+    Semantic search over several indexes at once.
+
+    The query is embedded once and the indexes are searched concurrently,
+    e.g. a controller index together with the shared plant-wide index, so a
+    question spanning several indexes costs one round trip instead of one
+    per index. An index that fails or exceeds `timeout` is skipped with a
+    warning; setup errors such as a missing SDK dependency or endpoint
+    (SEARCH_SETUP_ERRORS) are raised, since every index would fail alike.
+    Results are merged with reciprocal rank fusion, which also
+    drops chunks returned by more than one index, and each result names
+    the index it came from.
+
+    Args:
+        index_names (List[str]): Embeddings indexes to search.
+        query (str): Search query.
+        top_k (int): Number of merged results.
+        sourcefiles (List[str], optional): Only return chunks of these documents.
+        timeout (float): Seconds allowed per index.
+    """
+    query_embedding = await get_query_embedding(query)
+
+    async def search_index(index_name):
+        results = await asyncio.wait_for(
+            semantic_search(index_name, query, top_k, sourcefiles, query_embedding=query_embedding), timeout)
+        return [dict(result, index=index_name) for result in results]
+
+    responses = await asyncio.gather(*(search_index(index_name) for index_name in index_names), return_exceptions=True)
+    result_lists = []
+    for index_name, response in zip(index_names, responses):
+        if isinstance(response, SEARCH_SETUP_ERRORS):
+            raise response
+        if isinstance(response, asyncio.TimeoutError):
+            logging.warning(f"Search of {index_name} timed out after {timeout}s, skipping it")
+        elif isinstance(response, Exception):
+            logging.warning(f"Search of {index_name} failed, skipping it: {str(response)}")
+        else:
+            result_lists.append(response)
+    return reciprocal_rank_fusion(result_lists, top_k, key=lambda result: (result["source"], result["content"]))
+
+@lru_cache(maxsize=None)
+def get_bm25_index(index_name: str) -> BM25Index:
+    return BM25Index.load(index_name)
+
+def keyword_search(index_name: str, query: str, top_k: int = 3, sourcefiles: List[str] = None):
+    """
+    BM25 search of the local keyword index of `index_name`.
+
+    create_index.py builds it for the keyword indexes and main() for the
+    `_embeddings` indexes, over the same chunks that are embedded.
+    """
+    if not BM25Index.exists(index_name):
+        logging.warning(f"No local BM25 index for {index_name}, run tasks/create_index.py or "
+                        f"tasks/create_index_embeddings.py to build it")
+        return []
+    return [format_search_result(doc) for doc in get_bm25_index(index_name).search(query, top_k, sourcefiles)]
+
+async def hybrid_search(index_name: str, query: str, top_k: int = 3, sourcefiles: List[str] = None):
+    """
+    Fuse keyword and semantic results with reciprocal rank fusion.
+
+    Both retrievers search the chunks of the `_embeddings` index of
+    `index_name`: keyword results come from its local BM25 index, vector
+    results from semantic_search. Both run concurrently. Because the chunks
+    are the same, results are fused on the chunk id, so a chunk found by
+    both retrievers adds up its scores. BM25 answers exact tag-name queries
+    that embeddings rank poorly, while embeddings cover paraphrased
+    questions.
+
+    Args:
+        index_name (str): Index name, without the `_embeddings` suffix.
+        query (str): Search query.
+        top_k (int): Number of fused results; each retriever contributes twice as many candidates.
+        sourcefiles (List[str], optional): Only return chunks of these documents.
+    """
+    embeddings_index = f"{index_name}_embeddings"
+    keyword_results, vector_results = await asyncio.gather(
+        asyncio.to_thread(keyword_search, embeddings_index, query, 2 * top_k, sourcefiles),
+        semantic_search(embeddings_index, query, 2 * top_k, sourcefiles)
+    )
+    return reciprocal_rank_fusion([keyword_results, vector_results], top_k)
+
 def main():
+    parser = argparse.ArgumentParser(description="Create the vector search indexes and upload embedded document chunks.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep existing indexes and only re-embed new, changed or removed documents")
+    parser.add_argument("--vector-dtype", choices=VECTOR_DTYPES, default=DEFAULT_VECTOR_DTYPE,
+                        help="Storage format of the local vector index used by semantic_search")
+    args = parser.parse_args()
+
     logging.info("Starting the enhanced index creation and document upload process")
     
     try:
-        # Initialize OpenAI API
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-        
         # Read the configuration file
         with open(CONFIG_FILE, 'r') as config_file:
             index_config = json.load(config_file)
         
+        # Extracted pages are cached by content hash, so unchanged files are not parsed again
+        cache = ExtractionCache()
+        document_hashes = {}
         for _, index_data in index_config.items():
             index_name = f"{index_data['index_name']}_embeddings"
             document_list = [doc.strip() for doc in index_data['document_list'].split(',')]
-            
-            # Delete existing index if it exists
-            delete_index_if_exists(index_name)
-            
-            # Create enhanced search index with vector search
-            create_search_index(index_name)
-            
-            # Process each document
             for document_file in document_list:
-                content = read_document(document_file)  # Your existing document reading function
-                read_and_index_document(index_name, document_file, content)
+                if document_file not in document_hashes:
+                    document_hashes[document_file] = hash_file(os.path.join(DOCUMENT_DIR, document_file))
+
+            manifest = IndexManifest.load(index_name)
+            schema_hash = hash_schema(build_search_index(index_name))
+            local_index = LocalVectorIndex.load_or_create(index_name, args.vector_dtype)
+
+            if args.incremental and manifest.schema_hash == schema_hash and index_exists(index_name):
+                # Drop chunks of documents no longer configured, then only process changed ones
+                removed = manifest.removed_documents(document_list)
+                delete_chunks(index_name, [chunk_id for document in removed for chunk_id in manifest.chunk_ids(document)])
+                for document in removed:
+                    manifest.forget(document)
+                changed = manifest.changed_documents({document: document_hashes[document] for document in document_list})
+                logging.info(f"Index {index_name}: {len(changed)} new or changed, {len(removed)} removed documents")
+                if (not len(local_index) or not BM25Index.exists(index_name)) and manifest.documents:
+                    # Embeddings come from the embedding store, so rebuilding the local indexes is cheap
+                    logging.info(f"Local indexes for {index_name} are missing or in another format, re-processing all documents")
+                    changed = document_list
+                local_index.remove_sourcefiles(removed + changed)
+            else:
+                # Delete existing index if it exists
+                delete_index_if_exists(index_name)
+                
+                # Create enhanced search index with vector search
+                create_search_index(index_name)
+                manifest.reset(schema_hash)
+                local_index.clear()
+                changed = document_list
+            manifest.save()
+            
+            # Process each document, sharing one buffered uploader per index
+            uploaded = []
+            local_documents = []
+            with BatchUploader(get_search_client(index_name)) as uploader:
+                for document_file in changed:
+                    # Chunks are embedded and queued while later pages are still being read
+                    pages = iter_cached_document_pages(document_file, document_hashes[document_file], cache)
+                    chunk_ids = read_and_index_document(index_name, document_file, pages, uploader,
+                                                        join_pages=not is_table_document(document_file),
+                                                        local_index=local_index, local_documents=local_documents)
+                    uploaded.append((document_file, chunk_ids))
+            report = uploader.report
+            logging.info(f"Indexing complete for {index_name}. Succeeded: {report['succeeded']}, "
+                         f"Failed: {len(report['failed'])}, Batches: {report['batches']}, Elapsed: {report['elapsed']}s")
+            local_index.save()
+            get_local_index.cache_clear()
+            # Keyword index over the same chunks and ids, fused with the vectors in hybrid_search
+            update_keyword_index(index_name, document_list, changed, local_documents)
+            get_bm25_index.cache_clear()
+
+            for document_file, chunk_ids in uploaded:
+                if any(chunk_id in report['failed'] for chunk_id in chunk_ids):
+                    logging.warning(f"Document {document_file} has chunks that failed to index for {index_name}")
+                    manifest.mark_failed(document_file, chunk_ids)
+                    continue
+                # A shorter document leaves chunks with higher ids behind
+                delete_chunks(index_name, [chunk_id for chunk_id in manifest.chunk_ids(document_file) if chunk_id not in chunk_ids])
+                manifest.record(document_file, document_hashes[document_file], chunk_ids)
+            manifest.save()
         
         logging.info("Enhanced index creation and document upload complete.")
     except Exception as e:
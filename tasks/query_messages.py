@@ -1,11 +1,11 @@
 import os
 import json
 import logging
+from functools import lru_cache
 from dotenv import load_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from openai import AzureOpenAI
-from utils.telemetry_util import load_and_filter_data, get_treshold_violations
+from utils.chat_util import SEARCH_FIELDS, cite_result
+from utils import client_util
+from utils.trace_util import span, traced, collect_spans
 # Load environment variables
 load_dotenv()
 
@@ -26,22 +26,27 @@ openai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
 openai_key = os.getenv("AZURE_OPENAI_KEY")
 openai_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
 
-# Create clients
-search_client = SearchClient(search_endpoint, index_name, AzureKeyCredential(search_key))
-openai_client = AzureOpenAI(
-    api_key=openai_key,
-    api_version="2023-05-15",
-    azure_endpoint=openai_endpoint
-)
+# Clients and the system prompt are created on first use and telemetry is loaded in main(),
+# so importing this module is cheap
+def get_search_client():
+    return client_util.get_search_client(index_name, search_endpoint, search_key)
 
-# Load system prompt from file
-with open("prompts/system_prompt.md", "r") as f:
-    system_prompt = f.read().strip()
+def get_openai_client():
+    return client_util.get_azure_openai_client(openai_endpoint, openai_key)
+
+@lru_cache(maxsize=None)
+def get_system_prompt():
+    with open("prompts/system_prompt.md", "r") as f:
+        return f.read().strip()
 
 def search_documents(query):
-    results = search_client.search(query, top=TOP_N)
-    return [result['content'] for result in results]
+    with span("search_documents", "retrieval", query_chars=len(query)) as current:
+        results = get_search_client().search(query, top=TOP_N, select=SEARCH_FIELDS)
+        documents = [cite_result(result) for result in results]
+        current.set(results=len(documents), content_chars=sum(len(document) for document in documents))
+    return documents
 
+@traced(category="generation")
 def answer_question(question):
     relevant_docs = search_documents(question)
     
@@ -58,10 +63,11 @@ def answer_question(question):
     Answer the question based on the context provided. If the answer is not in the context, ask the user to provide more specific details.
     """
 
-    response = openai_client.chat.completions.create(
+    response = client_util.chat_completion(
+        get_openai_client(),
         model=openai_deployment,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": get_system_prompt()},
             {"role": "user", "content": prompt}
         ],
         max_tokens=150
@@ -70,6 +76,8 @@ def answer_question(question):
     return response.choices[0].message.content.strip()
 
 def main():
+    # pandas-backed helpers are only needed here, keeping the module cheap to import
+    from utils.telemetry_util import load_and_filter_data, get_treshold_violations
     logging.info("Starting the main function")
 
     # 1. Load filtered data
@@ -88,13 +96,16 @@ def main():
 
         # Form a new question for further details
         follow_up_question = f"{violation_message} Please give reasoning what could be done or describe the situation in further detail."
-        follow_up_answer = answer_question(follow_up_question)
+        # Time the search and completion of each alert for its own breakdown
+        with collect_spans() as spans, span("enrich_alert", "enrichment", tag=row['IDX_TagName']):
+            follow_up_answer = answer_question(follow_up_question)
 
         # Create a dictionary for the current violation
         alert_info = {
             "original_message": violation_message,
             "follow_up_question": follow_up_question,
-            "follow_up_answer": follow_up_answer
+            "follow_up_answer": follow_up_answer,
+            "timing": spans.breakdown()
         }
         enriched_alerts.append(alert_info)
 
@@ -2,24 +2,24 @@ import os
 import sys
 import json
 import logging
-import pandas as pd
+from functools import lru_cache
 from dotenv import load_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from openai import OpenAI
 
 # Add the parent directory to the Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-from utils.telemetry_util import load_and_filter_data, get_treshold_violations, format_gains_map
+from utils.chat_util import SEARCH_FIELDS, cite_result
+from utils import client_util
+from utils.trace_util import span, traced, collect_spans
 
 # Load environment variables
 load_dotenv()
 
 # Global variables
 TOP_N = 10  # Number of top documents to retrieve for context
+TOP_K_GAINS = 5  # Number of strongest MV/DV influences given as context per CV
 MODEL_NAME = "gpt-4o"  # Specify the model name here
 
 # Azure Cognitive Search setup
@@ -30,20 +30,27 @@ apc = 'APC-J140_BIN_005C'
 datasource = os.path.join(parent_dir, 'data', 'ADX_Export_APC_Tag_Values.csv')
 gainsmap = os.path.join(parent_dir, 'data', 'SIS-JIG T-Crushing PWO gain map.csv')
 
-# OpenAI setup
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Clients and the system prompt are created on first use and telemetry is loaded in main(),
+# so importing this module is cheap
+def get_search_client():
+    return client_util.get_search_client(index_name, search_endpoint, search_key)
 
-# Create clients
-search_client = SearchClient(search_endpoint, index_name, AzureKeyCredential(search_key))
+def get_openai_client():
+    return client_util.get_openai_client()
 
-# Load system prompt from file
-with open(os.path.join(parent_dir, "prompts", "system_prompt.md"), "r") as f:
-    system_prompt = f.read().strip()
+@lru_cache(maxsize=None)
+def get_system_prompt():
+    with open(os.path.join(parent_dir, "prompts", "system_prompt.md"), "r") as f:
+        return f.read().strip()
 
 def search_documents(query):
-    results = search_client.search(query, top=TOP_N)
-    return [result['content'] for result in results]
+    with span("search_documents", "retrieval", query_chars=len(query)) as current:
+        results = get_search_client().search(query, top=TOP_N, select=SEARCH_FIELDS)
+        documents = [cite_result(result) for result in results]
+        current.set(results=len(documents), content_chars=sum(len(document) for document in documents))
+    return documents
 
+@traced(category="generation")
 def answer_question(question):
     relevant_docs = search_documents(question)
     
@@ -60,10 +67,11 @@ def answer_question(question):
     Answer the question based on the context provided. If the answer is not in the context, ask the user to provide more specific details.
     """
 
-    response = client.chat.completions.create(
+    response = client_util.chat_completion(
+        get_openai_client(),
         model=MODEL_NAME,  # Use the global MODEL_NAME variable
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": get_system_prompt()},
             {"role": "user", "content": prompt}
         ],
         max_tokens=500  # Increased from 150 to 500
@@ -72,6 +80,9 @@ def answer_question(question):
     return response.choices[0].message.content.strip()
 
 def main():
+    # pandas-backed helpers are only needed here, keeping the module cheap to import
+    from utils.telemetry_util import load_and_filter_data, get_treshold_violations
+    from utils.gains_map_util import build_gains_index, GainMatrix
     logging.info("Starting the main function")
 
     # 1. Load filtered data
@@ -82,11 +93,13 @@ def main():
     logging.info("Calculating threshold violations")
     violations_df = get_treshold_violations(filtered_df)
 
-    # 3. Load and format gains map
-    logging.info(f"Loading gains map from {gainsmap}")
-    gains_df = pd.read_csv(gainsmap)
-    logging.info("Formatting gains map")
-    formatted_gains_df = format_gains_map(gains_df)
+    # 3. Load the compiled gains map index for all CVs
+    logging.info(f"Loading gains map index from {gainsmap}")
+    gains_index = build_gains_index(gainsmap)
+    gain_matrix = GainMatrix.from_index(gains_index)
+
+    # Rank the strongest influences for every violated tag in one batch
+    shortlists = gain_matrix.shortlist_batch(violations_df['IDX_TagName'].tolist(), TOP_K_GAINS)
 
     # 4. Iterate through violations and form questions
     output_file = "reports/system_alerts_enriched.json"
@@ -102,25 +115,28 @@ def main():
 
         # Get the corresponding gains information
         tag_name = row['IDX_TagName']
-        #gains_info = formatted_gains_df[formatted_gains_df['Variable Name'] == tag_name].to_dict('records')
-        gains_info = formatted_gains_df.head(1).to_dict('records')
-        print("GAINS INFO:", gains_info)
-        # Format gains information as a string if available
-        gains_context = ""
-        if gains_info:
+        gains_context = shortlists.get(tag_name, "")
+        if not gains_context:
+            # Not a CV: fall back to the raw gains rows the tag appears in (e.g. an MV/DV)
+            gains_info = gains_index.records(gains_index.lookup(tag_name))
             gains_context = "\n".join([f"{k}: {v}" for item in gains_info for k, v in item.items()])
+        # Format gains information as a string if available
+        if gains_context:
             follow_up_question = f"{violation_message}\n\nAdditional context:\n{gains_context}\n\nPlease give reasoning what could be done or describe the situation in further detail, considering the additional context provided."
         else:
             follow_up_question = f"{violation_message}\n\nPlease give reasoning what could be done or describe the situation in further detail."
 
-        follow_up_answer = answer_question(follow_up_question)
+        # Time the search and completion of each alert for its own breakdown
+        with collect_spans() as spans, span("enrich_alert", "enrichment", tag=tag_name):
+            follow_up_answer = answer_question(follow_up_question)
 
         # Create a dictionary for the current violation
         alert_info = {
             "original_message": violation_message,
             "gains_context": gains_context if gains_context else "No additional context available",
             "follow_up_question": follow_up_question,
-            "follow_up_answer": follow_up_answer
+            "follow_up_answer": follow_up_answer,
+            "timing": spans.breakdown()
         }
 
         # Append the current alert_info to the JSON file
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import multiprocessing
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Add the parent directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from utils.telemetry_util import filter_by_apc, get_treshold_violations
+from utils.gains_map_util import build_gains_index, GainMatrix
+from utils.rate_limit_util import SharedRateLimiter
+from utils.chat_chunker_util import create_clients, answer_question
+from utils.trace_util import span, collect_spans, enable_tracing
+
+# Global variables
+CONFIG_FILE = os.path.join(parent_dir, "config", "index_metadata.json")
+DATASOURCE = os.path.join(parent_dir, "data", "ADX_Export_APC_Tag_Values.csv")
+GAINSMAP = os.path.join(parent_dir, "data", "SIS-JIG T-Crushing PWO gain map.csv")
+SYSTEM_PROMPT_FILE = os.path.join(parent_dir, "prompts", "system_prompt.md")
+REPORTS_DIR = os.path.join(parent_dir, "reports")
+SUMMARY_FILE = os.path.join(REPORTS_DIR, "enrichment_summary.json")
+TRACE_FILE = os.path.join(REPORTS_DIR, "enrichment_trace.json")  # Spans of all workers, viewable in Perfetto
+MODEL_NAME = "gpt-4o"
+REQUESTS_PER_MINUTE = 60  # Combined LLM request budget across all workers
+TOP_K_GAINS = 5  # Number of strongest MV/DV influences given as context per CV
+
+def plan_jobs(index_config, controllers=None):
+    """
+    Plan one enrichment job per controller in the index metadata.
+
+    Entries without an `apc` (e.g. the gain map document) are skipped.
+
+    Args:
+        index_config (dict): Parsed config/index_metadata.json.
+        controllers (list, optional): Restrict to these controller ids.
+
+    Returns:
+        list: Job descriptions.
+    """
+    jobs = []
+    for controller_id, metadata in index_config.items():
+        if controllers and controller_id not in controllers:
+            continue
+        if not metadata.get('apc'):
+            logging.info(f"Skipping {controller_id}: no APC configured")
+            continue
+        jobs.append({
+            "controller_id": controller_id,
+            "apc": metadata['apc'],
+            "index_name": metadata['index_name'],
+            "output_file": os.path.join(REPORTS_DIR, f"system_alerts_enriched_{metadata['apc']}.json")
+        })
+    return jobs
+
+def run_job(job, violations_df, gainsmap, model_name, rate_limiter, progress_queue):
+    """
+    Enrich the violations of one controller. Runs in a worker process.
+
+    Args:
+        job (dict): Job description from plan_jobs.
+        violations_df (pd.DataFrame): Threshold violations for this controller.
+        gainsmap (str): Path to the gains map export, or None.
+        model_name (str): OpenAI model used for answers.
+        rate_limiter (SharedRateLimiter): Request budget shared by all jobs.
+        progress_queue: Manager queue receiving progress updates.
+
+    Returns:
+        dict: Job summary.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    start = time.time()
+    controller_id = job['controller_id']
+    total = len(violations_df)
+    summary = dict(job, violations=total, enriched=0, failed=0, rate_limit_wait=0.0)
+
+    search_client, openai_client = create_clients(job['index_name'])
+    with open(SYSTEM_PROMPT_FILE, "r") as f:
+        system_prompt = f.read().strip()
+
+    shortlists = {}
+    if gainsmap and os.path.exists(gainsmap):
+        gain_matrix = GainMatrix.from_index(build_gains_index(gainsmap))
+        shortlists = gain_matrix.shortlist_batch(violations_df['IDX_TagName'].tolist(), TOP_K_GAINS)
+
+    enriched_alerts = []
+    for done, (_, row) in enumerate(violations_df.iterrows(), start=1):
+        violation_message = row['message']
+        gains_context = shortlists.get(row['IDX_TagName'], "")
+        if gains_context:
+            follow_up_question = f"{violation_message}\n\nAdditional context:\n{gains_context}\n\nPlease give reasoning what could be done or describe the situation in further detail, considering the additional context provided."
+        else:
+            follow_up_question = f"{violation_message}\n\nPlease give reasoning what could be done or describe the situation in further detail."
+
+        # Time every stage of the alert, for the trace file and the alert's own breakdown
+        with collect_spans() as spans, span("enrich_alert", "enrichment", controller=controller_id, tag=row['IDX_TagName']):
+            try:
+                # Every LLM request of the answer, map and reduce calls included, draws from the shared budget
+                follow_up_answer = answer_question(search_client, openai_client, follow_up_question, system_prompt,
+                                                   model_name, rate_limiter=rate_limiter)
+                summary['enriched'] += 1
+            except Exception as e:
+                logging.error(f"[{controller_id}] Failed to enrich violation '{violation_message}': {str(e)}")
+                follow_up_answer = None
+                summary['failed'] += 1
+
+        timing = spans.breakdown()
+        summary['rate_limit_wait'] += timing['stages'].get('rate_limit_wait', {}).get('ms', 0.0) / 1000
+        enriched_alerts.append({
+            "original_message": violation_message,
+            "gains_context": gains_context if gains_context else "No additional context available",
+            "follow_up_question": follow_up_question,
+            "follow_up_answer": follow_up_answer,
+            "timing": timing
+        })
+        progress_queue.put({"controller_id": controller_id, "done": done, "total": total})
+
+    with open(job['output_file'], 'w') as f:
+        json.dump(enriched_alerts, f, indent=2)
+
+    summary['elapsed'] = round(time.time() - start, 2)
+    summary['rate_limit_wait'] = round(summary['rate_limit_wait'], 2)
+    return summary
+
+def report_progress(progress_queue):
+    """Log progress updates from the workers until a None sentinel arrives."""
+    while True:
+        update = progress_queue.get()
+        if update is None:
+            break
+        logging.info(f"[{update['controller_id']}] {update['done']}/{update['total']} violations enriched")
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich threshold violations for every configured controller in parallel.")
+    parser.add_argument("--config", default=CONFIG_FILE, help="Index metadata file listing the controllers")
+    parser.add_argument("--controllers", nargs="*", help="Only run these controller ids")
+    parser.add_argument("--datasource", default=DATASOURCE, help="Telemetry CSV export")
+    parser.add_argument("--gainsmap", default=GAINSMAP, help="Gains map CSV/XLSX export")
+    parser.add_argument("--model", default=MODEL_NAME, help="OpenAI model used for answers")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per job)")
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MINUTE, help="Combined LLM requests per minute")
+    parser.add_argument("--trace", default=TRACE_FILE, help="Trace file of per-stage spans, replaced on every run")
+    parser.add_argument("--no-trace", action="store_true", help="Do not write a trace file")
+    args = parser.parse_args()
+
+    start = time.time()
+    if not args.no_trace:
+        # Set before the workers start, so they append to the same file
+        if os.path.exists(args.trace):
+            os.remove(args.trace)
+        enable_tracing(args.trace)
+    with open(args.config, 'r') as config_file:
+        index_config = json.load(config_file)
+
+    jobs = plan_jobs(index_config, args.controllers)
+    if not jobs:
+        logging.warning("No controllers to process")
+        return
+    logging.info(f"Planned {len(jobs)} enrichment jobs: {[job['controller_id'] for job in jobs]}")
+
+    # Read the export once and hand each worker only its controller's violations
+    logging.info(f"Loading data from {args.datasource}")
+    telemetry_df = pd.read_csv(args.datasource)
+    violations = {job['controller_id']: get_treshold_violations(filter_by_apc(telemetry_df, job['apc'])) for job in jobs}
+    del telemetry_df
+
+    # Compile the gains index once so workers load it from the on-disk cache
+    if args.gainsmap and os.path.exists(args.gainsmap):
+        build_gains_index(args.gainsmap)
+    else:
+        logging.warning(f"Gains map {args.gainsmap} not found, enriching without gains context")
+
+    summaries = []
+    with multiprocessing.Manager() as manager:
+        rate_limiter = SharedRateLimiter(manager, args.rpm)
+        progress_queue = manager.Queue()
+        progress_thread = threading.Thread(target=report_progress, args=(progress_queue,), daemon=True)
+        progress_thread.start()
+
+        with ProcessPoolExecutor(max_workers=args.workers or len(jobs)) as executor:
+            futures = {
+                executor.submit(run_job, job, violations[job['controller_id']], args.gainsmap,
+                                args.model, rate_limiter, progress_queue): job
+                for job in jobs
+            }
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    summary = future.result()
+                    logging.info(f"[{job['controller_id']}] Completed: {summary['enriched']}/{summary['violations']} enriched in {summary['elapsed']}s")
+                except Exception as e:
+                    logging.error(f"[{job['controller_id']}] Job failed: {str(e)}")
+                    summary = dict(job, error=str(e))
+                summaries.append(summary)
+
+        progress_queue.put(None)
+        progress_thread.join()
+
+    combined = {
+        "elapsed": round(time.time() - start, 2),
+        "violations": sum(s.get('violations', 0) for s in summaries),
+        "enriched": sum(s.get('enriched', 0) for s in summaries),
+        "failed": sum(s.get('failed', 0) for s in summaries),
+        "jobs": sorted(summaries, key=lambda s: s['controller_id'])
+    }
+    with open(SUMMARY_FILE, 'w') as f:
+        json.dump(combined, f, indent=2)
+
+    logging.info(f"Enriched {combined['enriched']}/{combined['violations']} violations across {len(jobs)} controllers in {combined['elapsed']}s")
+    logging.info(f"Summary written to {SUMMARY_FILE}")
+    if not args.no_trace:
+        logging.info(f"Trace written to {args.trace}, open it in https://ui.perfetto.dev")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
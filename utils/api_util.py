@@ -1,9 +1,34 @@
 import os
+import functools
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, Optional
-from dotenv import load_dotenv
 
-load_dotenv()
+# HTTP configuration of calls to the backend API
+CONNECT_TIMEOUT = 10  # Seconds to establish a connection
+READ_TIMEOUT = 180  # Seconds to wait for a response; chat answers run an LLM call
+POOL_CONNECTIONS = 32  # Pooled keep-alive connections to the API host, about one per concurrent session
+
+@functools.lru_cache(maxsize=None)
+def get_api_base_url() -> Optional[str]:
+    """API_BASE_URL, loading .env on first use rather than at import."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.getenv('API_BASE_URL')
+
+@functools.lru_cache(maxsize=None)
+def get_session() -> requests.Session:
+    """
+    One requests session per process, shared by every page and rerun.
+
+    Reusing it keeps connections to the API alive, so a request after the
+    first skips the TCP and TLS handshakes.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 def get_api_response(
     endpoint: str,
@@ -27,16 +52,18 @@ def get_api_response(
     if not endpoint.startswith('/api/'):
         endpoint = f'/api{endpoint}' if endpoint.startswith('/') else f'/api/{endpoint}'
         
-    api_url = f"{os.getenv('API_BASE_URL')}{endpoint}"
+    api_url = f"{get_api_base_url()}{endpoint}"
+    session = get_session()
+    timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
     
     try:
         if method.upper() == "GET":
-            response = requests.get(api_url)
+            response = session.get(api_url, timeout=timeout)
         else:
             if use_form_data:
-                response = requests.post(api_url, data=payload)
+                response = session.post(api_url, data=payload, timeout=timeout)
             else:
-                response = requests.post(api_url, json=payload)
+                response = session.post(api_url, json=payload, timeout=timeout)
             
         response.raise_for_status()
         return {"data": response.json(), "error": False}
@@ -65,7 +92,7 @@ def get_chat_response(
     Returns:
         Dict[str, Any]: The API response containing the answer and metadata
     """
-    api_url = f"{os.getenv('API_BASE_URL')}/chat"
+    api_url = f"{get_api_base_url()}/chat"
     
     payload = {
         "question": question,
@@ -75,7 +102,7 @@ def get_chat_response(
     }
     
     try:
-        response = requests.post(api_url, json=payload)
+        response = get_session().post(api_url, json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import logging
+import numpy as np
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from utils.term_util import tokenize_terms, STOPWORDS
+
+# Location of local keyword indexes, one directory per search index
+BM25_INDEX_DIR = os.path.join(".cache", "bm25")
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # Rank offset of reciprocal rank fusion; larger values flatten the head of each list
+TAG_SEPARATOR_PATTERN = re.compile(r"[-_.]")
+
+def analyze(text: str) -> List[str]:
+    """
+    Index terms of a text.
+
+    Tag names such as PID-J141-LIC-G1118.OP are kept whole for exact matches
+    and also split into their parts, so a query for J141 finds them too.
+    """
+    terms = []
+    for term in tokenize_terms(text):
+        if not term or term in STOPWORDS:
+            continue
+        terms.append(term)
+        if TAG_SEPARATOR_PATTERN.search(term):
+            terms.extend(part for part in TAG_SEPARATOR_PATTERN.split(term) if len(part) > 1)
+    return terms
+
+class BM25Index:
+    """
+    Local BM25 inverted index over the documents of one search index.
+
+    The index is persisted as a sorted term dictionary plus flat postings
+    arrays: the postings of term i are docs[offsets[i]:offsets[i + 1]] with
+    matching term frequencies. Documents keep their content and metadata, so
+    results can be returned without the search service. A query scores only
+    the postings of its own terms with vectorized NumPy operations.
+
+        index = BM25Index.load("pwo")
+        hits = index.search("PID-J141-LIC-G1118.OP", top_k=3)
+    """
+
+    def __init__(self, index_name: str, index_dir: str = BM25_INDEX_DIR):
+        self.index_name = index_name
+        self.path = os.path.join(index_dir, index_name)
+        self.documents: List[Dict[str, Any]] = []
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings_docs = np.zeros(0, dtype=np.int32)
+        self.postings_tf = np.zeros(0, dtype=np.float32)
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def exists(cls, index_name: str, index_dir: str = BM25_INDEX_DIR) -> bool:
+        return os.path.exists(os.path.join(index_dir, index_name, "terms.json"))
+
+    @classmethod
+    def load(cls, index_name: str, index_dir: str = BM25_INDEX_DIR) -> 'BM25Index':
+        index = cls(index_name, index_dir)
+        with open(os.path.join(index.path, "documents.json"), 'r') as f:
+            index.documents = json.load(f)
+        with open(os.path.join(index.path, "terms.json"), 'r') as f:
+            index.terms = json.load(f)
+        index.term_ids = {term: i for i, term in enumerate(index.terms)}
+        postings = np.load(os.path.join(index.path, "postings.npz"))
+        index.offsets = postings["offsets"]
+        index.postings_docs = postings["docs"]
+        index.postings_tf = postings["tf"]
+        index.doc_lengths = postings["doc_lengths"]
+        return index
+
+    @classmethod
+    def build(cls, index_name: str, documents: Iterable[Dict[str, Any]], text_field: str = "content",
+              index_dir: str = BM25_INDEX_DIR) -> 'BM25Index':
+        """
+        Build the index from documents as uploaded to Azure AI Search.
+
+        Args:
+            index_name (str): Name of the search index.
+            documents (Iterable[Dict[str, Any]]): Documents with an "id" and `text_field`.
+            text_field (str): Field holding the text to index.
+        """
+        index = cls(index_name, index_dir)
+        postings: Dict[str, List] = {}
+        doc_lengths = []
+        for doc_id, document in enumerate(documents):
+            counts = Counter(analyze(document.get(text_field) or ""))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+            doc_lengths.append(sum(counts.values()))
+            index.documents.append(document)
+
+        index.terms = sorted(postings)
+        index.term_ids = {term: i for i, term in enumerate(index.terms)}
+        lengths = [len(postings[term]) for term in index.terms]
+        index.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        index.postings_docs = np.fromiter((doc_id for term in index.terms for doc_id, _ in postings[term]),
+                                          dtype=np.int32, count=int(index.offsets[-1]))
+        index.postings_tf = np.fromiter((tf for term in index.terms for _, tf in postings[term]),
+                                        dtype=np.float32, count=int(index.offsets[-1]))
+        index.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        return index
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        np.savez(os.path.join(self.path, "postings.npz"), offsets=self.offsets, docs=self.postings_docs,
+                 tf=self.postings_tf, doc_lengths=self.doc_lengths)
+        with open(os.path.join(self.path, "documents.json"), 'w') as f:
+            json.dump(self.documents, f)
+        # Written last: its presence marks a complete index
+        with open(os.path.join(self.path, "terms.json"), 'w') as f:
+            json.dump(self.terms, f)
+        logging.info(f"Saved BM25 index {self.index_name} with {len(self.documents)} documents and {len(self.terms)} terms")
+
+    def search(self, query: str, top_k: int = 3, sourcefiles: Optional[Sequence[str]] = None,
+               k1: float = BM25_K1, b: float = BM25_B) -> List[Dict[str, Any]]:
+        """
+        BM25 top-k for a query.
+
+        Returns:
+            List[Dict[str, Any]]: The best documents with a "score", best first.
+        """
+        if not self.documents:
+            return []
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        average_length = float(self.doc_lengths.mean()) or 1.0
+        for term in set(analyze(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, tf = self.postings_docs[start:stop], self.postings_tf[start:stop]
+            idf = np.log(1 + (len(self.documents) - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * self.doc_lengths[docs] / average_length))
+
+        if sourcefiles:
+            sourcefiles = set(sourcefiles)
+            scores[[i for i, document in enumerate(self.documents) if document.get("sourcefile") not in sourcefiles]] = 0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [dict(self.documents[i], score=float(scores[i])) for i in candidates]
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Dict[str, Any]]], top_k: Optional[int] = None,
+                           k: int = RRF_K, key: Callable[[Dict[str, Any]], Any] = lambda result: result["id"]
+                           ) -> List[Dict[str, Any]]:
+    """
+    Merge ranked result lists with reciprocal rank fusion.
+
+    Each result scores sum(1 / (k + rank)) over the lists it appears in, so
+    lists with incomparable scores (BM25, cosine) can be combined. Results
+    are deduplicated by `key`, keeping the first occurrence.
+
+    Returns:
+        List[Dict[str, Any]]: Fused results with an "rrf_score", best first.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            result_key = key(result)
+            if result_key not in fused:
+                fused[result_key] = dict(result, rrf_score=0.0)
+            fused[result_key]["rrf_score"] += 1.0 / (k + rank)
+    merged = sorted(fused.values(), key=lambda result: result["rrf_score"], reverse=True)
+    return merged[:top_k] if top_k else merged
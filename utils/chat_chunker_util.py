@@ -1,9 +1,17 @@
 import os
+import re
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from dotenv import load_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from openai import OpenAI
 import tiktoken
+from utils.chat_util import SEARCH_FIELDS, cite_result, citation
+from utils.client_util import get_search_client, get_openai_client, chat_completion
+from utils.trace_util import span, traced, bind_context
+from utils.term_util import tokenize_terms, STOPWORDS
 
 # Load environment variables
 load_dotenv()
@@ -19,70 +27,299 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 TOP_N = 3
 MAX_TOKENS = 12000  # Safe limit below model's context length
 CHUNK_OVERLAP = 100  # Number of tokens to overlap between chunks
+DEFAULT_MODEL = "gpt-4"  # Model whose tokenizer is used for counting and chunking
+TOKEN_COUNT_CACHE_SIZE = 4096  # Number of remembered token counts
+MAX_CONCURRENT_CHUNKS = 4  # Maximum concurrent LLM calls when answering over several chunks
+REDUCE_FANOUT = 4  # Partial answers combined per summary call
+# Phrases of answers that ask for more details instead of answering
+INSUFFICIENT_CONTEXT_MARKERS = ("more specific details", "not in the context", "don't have enough information")
+# Answer given when retrieval leaves nothing to answer from
+NO_CONTEXT_ANSWER = "I don't have enough information to answer that question. Could you please provide more specific details?"
+
+# Context packing configuration
+PASSAGE_MAX_TOKENS = 300  # Maximum tokens per passage when packing context
+NEIGHBOR_WINDOW = 1  # Passages on each side of a selected passage that are packed with it
+DOCUMENT_SCORE_WEIGHT = 0.5  # Weight of the normalized search score in passage scores
+PASSAGE_SEPARATOR_TOKENS = 2  # Tokens reserved for the separator between packed passages
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+
+# Token counts keyed by a digest of the text, so large texts are not kept alive
+_token_count_cache = OrderedDict()
+_token_count_lock = threading.Lock()
 
 def create_clients(index_name):
-    search_client = SearchClient(search_endpoint, index_name, AzureKeyCredential(search_key))
-    openai_client = OpenAI(api_key=openai_api_key)
+    # Shared per index and process, so repeated calls reuse pooled connections
+    search_client = get_search_client(index_name, search_endpoint, search_key)
+    openai_client = get_openai_client(openai_api_key)
     return search_client, openai_client
 
 def load_system_prompt():
     with open("prompts/system_prompt.md", "r") as f:
         return f.read().strip()
 
-def count_tokens(text, model="gpt-4"):
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(text))
+@lru_cache(maxsize=None)
+def get_encoding(model=DEFAULT_MODEL):
+    """Return the tiktoken encoding for a model, loading it only once per process."""
+    return tiktoken.encoding_for_model(model)
 
-def chunk_context(context, max_tokens):
-    """Split context into chunks that fit within token limit."""
-    encoding = tiktoken.encoding_for_model("gpt-4")
-    tokens = encoding.encode(context)
-    
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    for token in tokens:
-        current_chunk.append(token)
-        current_length += 1
-        
-        if current_length >= max_tokens:
-            chunks.append(encoding.decode(current_chunk))
-            # Keep last CHUNK_OVERLAP tokens for context continuity
-            current_chunk = current_chunk[-CHUNK_OVERLAP:]
-            current_length = len(current_chunk)
-    
-    if current_chunk:
-        chunks.append(encoding.decode(current_chunk))
-    
-    return chunks
+def _token_cache_key(text, model):
+    return model, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
 
-def search_documents(search_client, query):
-    results = search_client.search(query, top=TOP_N)
-    return [result['content'] for result in results]
+def _remember_token_count(key, count):
+    with _token_count_lock:
+        _token_count_cache[key] = count
+        _token_count_cache.move_to_end(key)
+        while len(_token_count_cache) > TOKEN_COUNT_CACHE_SIZE:
+            _token_count_cache.popitem(last=False)
 
-def answer_question(search_client, openai_client, question, system_prompt, model_name):
-    relevant_docs = search_documents(search_client, question)
-    
-    if not relevant_docs:
-        return "I don't have enough information to answer that question. Could you please provide more specific details?"
-    
-    # Combine all retrieved documents into context
-    full_context = "\n\n".join(relevant_docs)
-    
-    # Calculate available tokens (accounting for system prompt, question, and response)
-    system_tokens = count_tokens(system_prompt)
-    question_tokens = count_tokens(question)
-    buffer_tokens = 1000  # Reserve tokens for response and formatting
-    available_tokens = MAX_TOKENS - system_tokens - question_tokens - buffer_tokens
-    
-    # Split context into manageable chunks
-    context_chunks = chunk_context(full_context, available_tokens)
-    
-    # Process each chunk and accumulate responses
-    all_responses = []
-    
-    for chunk in context_chunks:
+def count_tokens(text, model=DEFAULT_MODEL):
+    """Count tokens in text, reusing the count for text measured before."""
+    key = _token_cache_key(text, model)
+    with _token_count_lock:
+        count = _token_count_cache.get(key)
+    if count is None:
+        count = len(get_encoding(model).encode_ordinary(text))
+        _remember_token_count(key, count)
+    return count
+
+def encode_batch(texts, model=DEFAULT_MODEL):
+    """
+    Encode many documents in one call, using tiktoken's threaded batch encoder.
+
+    The token counts are remembered, so a later count_tokens on the same text
+    does not encode it again.
+    """
+    token_lists = get_encoding(model).encode_ordinary_batch(list(texts))
+    for text, tokens in zip(texts, token_lists):
+        _remember_token_count(_token_cache_key(text, model), len(tokens))
+    return token_lists
+
+def chunk_context(context, max_tokens, overlap=CHUNK_OVERLAP, tokens=None, model=DEFAULT_MODEL):
+    """
+    Split context into chunks that fit within token limit.
+
+    Windows of max_tokens are sliced from the token array with a stride of
+    max_tokens - overlap, so consecutive chunks share `overlap` tokens.
+
+    Args:
+        context (str): Text to split.
+        max_tokens (int): Maximum tokens per chunk.
+        overlap (int): Tokens shared between consecutive chunks, capped at half of max_tokens.
+        tokens (list, optional): Pre-computed tokens of context, e.g. from encode_batch.
+        model (str): Model whose encoding is used.
+
+    Returns:
+        list: Decoded chunks.
+    """
+    if max_tokens <= 0:
+        raise ValueError(f"max_tokens must be positive, got {max_tokens}")
+    # Small windows keep at most half of each chunk as overlap so the stride stays positive
+    overlap = min(overlap, max_tokens // 2)
+    stride = max_tokens - overlap
+
+    encoding = get_encoding(model)
+    if tokens is None:
+        tokens = encoding.encode_ordinary(context)
+    if not tokens:
+        return []
+
+    windows = [tokens[start:start + max_tokens] for start in range(0, max(len(tokens) - overlap, 1), stride)]
+    return encoding.decode_batch(windows)
+
+def search_documents(search_client, query, with_scores=False):
+    """
+    Search the index for the query.
+
+    Returns:
+        list: Cited result texts, or with_scores (content, search score,
+        citation) triples so the citation can be placed per passage.
+    """
+    with span("search_documents", "retrieval", query_chars=len(query)) as current:
+        results = search_client.search(query, top=TOP_N, select=SEARCH_FIELDS)
+        if with_scores:
+            documents = [(result['content'], result.get('@search.score') or 0.0, citation(result)) for result in results]
+            current.set(results=len(documents), content_chars=sum(len(content) for content, _, _ in documents))
+        else:
+            documents = [cite_result(result) for result in results]
+            current.set(results=len(documents), content_chars=sum(len(content) for content in documents))
+        return documents
+
+def split_passages(document, max_tokens=PASSAGE_MAX_TOKENS, model=DEFAULT_MODEL):
+    """
+    Split a document into passages of at most max_tokens tokens.
+
+    Paragraphs are merged while they fit; paragraphs larger than max_tokens
+    are cut into token windows.
+
+    Returns:
+        list: (passage text, token count) pairs in document order.
+    """
+    paragraphs = [paragraph.strip() for paragraph in PARAGRAPH_PATTERN.split(document) if paragraph.strip()]
+    if not paragraphs:
+        return []
+
+    passages = []
+    current, current_tokens = [], 0
+    for paragraph, tokens in zip(paragraphs, encode_batch(paragraphs, model)):
+        if len(tokens) > max_tokens:
+            if current:
+                passages.append(("\n\n".join(current), current_tokens))
+                current, current_tokens = [], 0
+            for window in chunk_context(paragraph, max_tokens, overlap=0, tokens=tokens, model=model):
+                passages.append((window, min(len(tokens), max_tokens)))
+            continue
+        if current and current_tokens + len(tokens) + 1 > max_tokens:
+            passages.append(("\n\n".join(current), current_tokens))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += len(tokens) + (1 if len(current) > 1 else 0)
+    if current:
+        passages.append(("\n\n".join(current), current_tokens))
+    return passages
+
+def score_passages(passages, question, k1=1.2, b=0.75):
+    """BM25 score of every passage against the question, with IDF over the passages themselves."""
+    query_terms = set(tokenize_terms(question)) - STOPWORDS
+    term_counts = [Counter(tokenize_terms(text)) for text in passages]
+    if not query_terms or not term_counts:
+        return [0.0] * len(passages)
+
+    document_frequency = Counter(term for counts in term_counts for term in query_terms if term in counts)
+    lengths = [sum(counts.values()) for counts in term_counts]
+    average_length = (sum(lengths) / len(lengths)) or 1.0
+    total = len(passages)
+
+    scores = []
+    for counts, length in zip(term_counts, lengths):
+        score = 0.0
+        for term in query_terms:
+            tf = counts.get(term, 0)
+            if tf:
+                idf = math.log(1 + (total - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+def pack_context(documents, question, max_tokens, model=DEFAULT_MODEL):
+    """
+    Fill a token budget with the passages most relevant to the question.
+
+    Retrieved documents are split into passages and scored lexically against
+    the question, boosted by their document's search score. Passages are
+    taken best first, each followed by its neighbours within
+    NEIGHBOR_WINDOW, until the budget is spent. The selection is returned in
+    document order, and every run of adjacent passages starts with its
+    document's citation, so no packed passage is left unattributed.
+
+    Args:
+        documents (list): Document texts, (text, search score) pairs or
+            (text, search score, citation) triples, in rank order.
+        question (str): The user's question.
+        max_tokens (int): Token budget for the packed context.
+        model (str): Model whose encoding is used.
+
+    Returns:
+        str: The packed context.
+    """
+    documents = [
+        (document, 0.0, "") if not isinstance(document, tuple)
+        else document if len(document) == 3 else (document[0], document[1], "")
+        for document in documents
+    ]
+    max_search_score = max((score for _, score, _ in documents), default=0.0) or 1.0
+    citations = [document_citation for _, _, document_citation in documents]
+    citation_tokens = [count_tokens(document_citation) + 1 if document_citation else 0 for document_citation in citations]
+
+    # Flat list of passages keyed by (document rank, passage position)
+    keys, texts, token_counts, boosts = [], [], [], []
+    for rank, (document, search_score, _) in enumerate(documents):
+        for position, (text, tokens) in enumerate(split_passages(document, model=model)):
+            keys.append((rank, position))
+            texts.append(text)
+            token_counts.append(tokens)
+            boosts.append(DOCUMENT_SCORE_WEIGHT * search_score / max_search_score)
+    if not texts:
+        return ""
+
+    lexical = score_passages(texts, question)
+    scores = [score + boost for score, boost in zip(lexical, boosts)]
+    # Ties (e.g. nothing matches lexically) keep search rank and document order
+    order = sorted(range(len(texts)), key=lambda i: (-scores[i], keys[i]))
+    position_of = {key: i for i, key in enumerate(keys)}
+
+    selected = set()
+    remaining = max_tokens
+    for i in order:
+        if remaining <= 0:
+            break
+        rank, position = keys[i]
+        candidates = [i] + [
+            position_of[(rank, position + offset)]
+            for distance in range(1, NEIGHBOR_WINDOW + 1)
+            for offset in (-distance, distance)
+            if (rank, position + offset) in position_of
+        ]
+        for candidate in candidates:
+            cost = token_counts[candidate] + PASSAGE_SEPARATOR_TOKENS
+            # A passage that starts a run carries the citation; never undercounts, as runs only grow
+            candidate_rank, candidate_position = keys[candidate]
+            if position_of.get((candidate_rank, candidate_position - 1)) not in selected:
+                cost += citation_tokens[candidate_rank]
+            if candidate not in selected and cost <= remaining:
+                selected.add(candidate)
+                remaining -= cost
+
+    packed = []
+    previous = None
+    for i in sorted(selected, key=lambda i: keys[i]):
+        rank, position = keys[i]
+        starts_run = previous != (rank, position - 1)
+        if previous is not None and starts_run:
+            packed.append("...")
+        packed.append(f"{citations[rank]} {texts[i]}" if starts_run and citations[rank] else texts[i])
+        previous = (rank, position)
+    return "\n\n".join(packed)
+
+def complete(openai_client, model_name, system_prompt, prompt, rate_limiter=None):
+    """Run a single chat completion and return the stripped answer text."""
+    response = chat_completion(
+        openai_client,
+        rate_limiter=rate_limiter,
+        model=model_name,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=150
+    )
+    return response.choices[0].message.content.strip()
+
+def is_confident_answer(answer):
+    """Whether an answer addresses the question rather than asking for more details."""
+    answer = answer.lower()
+    return not any(marker in answer for marker in INSUFFICIENT_CONTEXT_MARKERS)
+
+def map_chunks(openai_client, question, context_chunks, system_prompt, model_name,
+               max_workers=MAX_CONCURRENT_CHUNKS, early_exit=False, rate_limiter=None):
+    """
+    Answer the question against every context chunk concurrently.
+
+    Args:
+        openai_client: OpenAI client.
+        question (str): The user's question.
+        context_chunks (list): Context chunks that each fit the token budget.
+        system_prompt (str): System prompt.
+        model_name (str): Chat model.
+        max_workers (int): Maximum concurrent LLM calls.
+        early_exit (bool): Return as soon as one chunk yields a confident
+            answer and cancel the chunks that have not started.
+        rate_limiter (optional): Limiter acquired before every LLM request.
+
+    Returns:
+        list: Partial answers in chunk order, or the single confident answer
+        when exiting early.
+    """
+    def answer_chunk(chunk):
         prompt = f"""
         Context: {chunk}
 
@@ -90,39 +327,90 @@ def answer_question(search_client, openai_client, question, system_prompt, model
 
         Answer the question based on the context provided. If the answer is not in the context, ask the user to provide more specific details.
         """
+        return complete(openai_client, model_name, system_prompt, prompt, rate_limiter)
 
-        response = openai_client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150
-        )
-        
-        all_responses.append(response.choices[0].message.content.strip())
-    
-    # Combine all responses
-    if len(all_responses) == 1:
-        return all_responses[0]
-    else:
-        # If multiple chunks were processed, summarize the responses
+    if len(context_chunks) == 1:
+        return [answer_chunk(context_chunks[0])]
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(bind_context(answer_chunk), chunk): position for position, chunk in enumerate(context_chunks)}
+        answers = [None] * len(context_chunks)
+        for future in as_completed(futures):
+            answer = future.result()
+            if early_exit and is_confident_answer(answer):
+                return [answer]
+            answers[futures[future]] = answer
+        return answers
+    finally:
+        # Do not wait for in-flight calls when exiting early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def reduce_answers(openai_client, question, answers, system_prompt, model_name,
+                   fanout=REDUCE_FANOUT, max_workers=MAX_CONCURRENT_CHUNKS, rate_limiter=None):
+    """
+    Combine partial answers with a tree of summary calls.
+
+    Answers are summarized in groups of `fanout`, concurrently, level by
+    level until one answer remains, so many partial answers cost
+    log_fanout(n) rounds instead of one oversized prompt.
+    """
+    if not answers:
+        # No context chunks were answered, e.g. the retrieved documents were empty
+        return NO_CONTEXT_ANSWER
+
+    # Partial answers that only ask for more details add nothing to the summary
+    confident = [answer for answer in answers if is_confident_answer(answer)]
+    answers = confident or answers
+
+    def summarize(group):
+        if len(group) == 1:
+            return group[0]
+        joined_responses = '\n'.join(group)
         summary_prompt = f"""
         I have received multiple responses to the question: {question}
 
         Responses:
-        {'\n'.join(all_responses)}
+        {joined_responses}
 
         Please provide a coherent summary of these responses.
         """
-        
-        final_response = openai_client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": summary_prompt}
-            ],
-            max_tokens=150
-        )
-        
-        return final_response.choices[0].message.content.strip()
+        return complete(openai_client, model_name, system_prompt, summary_prompt, rate_limiter)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(answers) > 1:
+            groups = [answers[i:i + fanout] for i in range(0, len(answers), fanout)]
+            answers = list(executor.map(bind_context(summarize), groups))
+    return answers[0]
+
+@traced(category="generation")
+def answer_question(search_client, openai_client, question, system_prompt, model_name,
+                    early_exit=False, max_workers=MAX_CONCURRENT_CHUNKS, pack=True, rate_limiter=None):
+    relevant_docs = search_documents(search_client, question, with_scores=True)
+    
+    if not relevant_docs:
+        return NO_CONTEXT_ANSWER
+    
+    # Calculate available tokens (accounting for system prompt, question, and response)
+    system_tokens = count_tokens(system_prompt)
+    question_tokens = count_tokens(question)
+    buffer_tokens = 1000  # Reserve tokens for response and formatting
+    available_tokens = MAX_TOKENS - system_tokens - question_tokens - buffer_tokens
+    
+    with span("build_prompt", "generation", available_tokens=available_tokens) as current:
+        if pack:
+            # Fill the budget with the most relevant passages so one call suffices
+            packed = pack_context(relevant_docs, question, available_tokens)
+            context_chunks = [packed] if packed else []
+        else:
+            # Combine all retrieved documents into context and split it into manageable chunks
+            full_context = "\n\n".join(f"{document_citation} {content}" if document_citation else content
+                                         for content, _, document_citation in relevant_docs)
+            context_chunks = chunk_context(full_context, available_tokens)
+        current.set(context_chunks=len(context_chunks))
+    
+    # Answer all chunks concurrently, then combine the partial answers
+    all_responses = map_chunks(openai_client, question, context_chunks, system_prompt, model_name,
+                               max_workers=max_workers, early_exit=early_exit, rate_limiter=rate_limiter)
+    return reduce_answers(openai_client, question, all_responses, system_prompt, model_name,
+                          max_workers=max_workers, rate_limiter=rate_limiter)
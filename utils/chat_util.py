@@ -1,8 +1,7 @@
 import os
 from dotenv import load_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from openai import OpenAI
+from utils.client_util import get_search_client, get_openai_client, chat_completion
+from utils.trace_util import span, traced
 
 # Load environment variables
 load_dotenv()
@@ -14,19 +13,42 @@ search_key = os.getenv("AZURE_SEARCH_KEY")
 # OpenAI setup
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
+# Fields returned by keyword searches; chunks carry their source for citations
+SEARCH_FIELDS = ["content", "sourcefile", "page", "chunk_id"]
+
 def create_clients(index_name):
-    search_client = SearchClient(search_endpoint, index_name, AzureKeyCredential(search_key))
-    openai_client = OpenAI(api_key=openai_api_key)
+    search_client = get_search_client(index_name, search_endpoint, search_key)
+    openai_client = get_openai_client(openai_api_key)
     return search_client, openai_client
 
 def load_system_prompt():
     with open("prompts/system_prompt.md", "r") as f:
         return f.read().strip()
 
+def citation(result):
+    """
+    The `[file, p. N]` citation of a search result, or "" if it has no source.
+
+    Spreadsheet and CSV chunks have no page and are cited as `[file]`.
+    """
+    source = result.get('sourcefile')
+    if not source:
+        return ""
+    page = result.get('page')
+    return f"[{source}, p. {page}]" if page else f"[{source}]"
+
+def cite_result(result):
+    """Content of a search result, prefixed with the document and page it comes from."""
+    result_citation = citation(result)
+    return f"{result_citation} {result['content']}" if result_citation else result['content']
+
 def search_documents(search_client, query):
-    results = search_client.search(query)
-    return [result['content'] for result in results]
+    with span("search_documents", "retrieval", query_chars=len(query)) as current:
+        documents = [cite_result(result) for result in search_client.search(query, select=SEARCH_FIELDS)]
+        current.set(results=len(documents), content_chars=sum(len(document) for document in documents))
+    return documents
 
+@traced(category="generation")
 def answer_question(search_client, openai_client, question, system_prompt, model_name):
     relevant_docs = search_documents(search_client, question)
     
@@ -43,7 +65,8 @@ def answer_question(search_client, openai_client, question, system_prompt, model
     Answer the question based on the context provided. If the answer is not in the context, ask the user to provide more specific details.
     """
 
-    response = openai_client.chat.completions.create(
+    response = chat_completion(
+        openai_client,
         model=model_name,
         messages=[
             {"role": "system", "content": system_prompt},
@@ -0,0 +1,248 @@
+import os
+import time
+import random
+import logging
+import functools
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, Callable, Optional, Sequence
+from dotenv import load_dotenv
+from utils.trace_util import span
+
+# The SDKs are imported when the first client is created, keeping this module cheap to import
+if TYPE_CHECKING:
+    import httpx
+    from azure.core.pipeline.transport import RequestsTransport
+    from azure.search.documents import SearchClient
+    from azure.search.documents.indexes import SearchIndexClient
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+    from openai import OpenAI, AzureOpenAI, AsyncOpenAI
+
+# Load environment variables
+load_dotenv()
+
+# HTTP configuration shared by all clients
+CONNECT_TIMEOUT = 10.0  # Seconds to establish a connection
+READ_TIMEOUT = 120.0  # Seconds to wait for a response; completions over large contexts can be slow
+MAX_CONNECTIONS = 20  # Pooled connections per client
+MAX_KEEPALIVE_CONNECTIONS = 10  # Idle connections kept open for reuse
+
+# Retry configuration
+MAX_RETRIES = 5  # Retries of a throttled or transiently failed call
+RETRY_BACKOFF = 1.0  # Base delay in seconds, doubled per attempt
+MAX_RETRY_DELAY = 60.0  # Upper bound on a single wait, including Retry-After
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+SEARCH_API_VERSION = "2023-10-01-Preview"
+SEARCH_IN_DELIMITERS = ("|", ",", ";", "~", "^")  # Candidate value separators of search.in filters
+
+def _http_timeout() -> 'httpx.Timeout':
+    import httpx
+    return httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+def _http_client() -> 'httpx.Client':
+    import httpx
+    return httpx.Client(
+        timeout=_http_timeout(),
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+    )
+
+@functools.lru_cache(maxsize=None)
+def _search_transport() -> 'RequestsTransport':
+    """One pooled requests session shared by every synchronous Azure AI Search client."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from azure.core.pipeline.transport import RequestsTransport
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_CONNECTIONS, pool_maxsize=MAX_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Timeouts must be set here: client-level timeouts are ignored once a transport is supplied
+    return RequestsTransport(session=session, session_owner=False,
+                             connection_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT)
+
+def _search_options() -> dict:
+    # The SDK retry policy already honors Retry-After on 429 and 503 responses
+    return {
+        "connection_timeout": CONNECT_TIMEOUT,
+        "read_timeout": READ_TIMEOUT,
+        "retry_total": MAX_RETRIES,
+        "retry_backoff_factor": RETRY_BACKOFF,
+        "retry_backoff_max": MAX_RETRY_DELAY,
+    }
+
+@functools.lru_cache(maxsize=None)
+def get_openai_client(api_key: Optional[str] = None) -> 'OpenAI':
+    """
+    Shared OpenAI client with pooled connections and timeouts.
+
+    The SDK's own retries are disabled; wrap calls with call_with_retries.
+    """
+    from openai import OpenAI
+    return OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), http_client=_http_client(), max_retries=0)
+
+@functools.lru_cache(maxsize=None)
+def get_azure_openai_client(endpoint: Optional[str] = None, api_key: Optional[str] = None,
+                            api_version: str = "2023-05-15") -> 'AzureOpenAI':
+    """Shared Azure OpenAI client per endpoint, with pooled connections and timeouts."""
+    from openai import AzureOpenAI
+    return AzureOpenAI(
+        api_key=api_key or os.getenv("AZURE_OPENAI_KEY"),
+        api_version=api_version,
+        azure_endpoint=endpoint or os.getenv("AZURE_OPENAI_ENDPOINT"),
+        http_client=_http_client(),
+        max_retries=0
+    )
+
+def create_async_openai_client(api_key: Optional[str] = None) -> 'AsyncOpenAI':
+    """
+    New async OpenAI client with the shared timeouts.
+
+    Async clients are bound to the event loop they are used on, so they are
+    not cached; use one per `asyncio.run` with `async with`.
+    """
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), timeout=_http_timeout(), max_retries=MAX_RETRIES)
+
+@functools.lru_cache(maxsize=None)
+def get_search_client(index_name: str, endpoint: Optional[str] = None, key: Optional[str] = None,
+                      api_version: str = SEARCH_API_VERSION) -> 'SearchClient':
+    """Shared Azure AI Search client per (endpoint, index), on the pooled transport."""
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents import SearchClient
+    return SearchClient(
+        endpoint=endpoint or os.getenv("AZURE_SEARCH_ENDPOINT"),
+        index_name=index_name,
+        credential=AzureKeyCredential(key or os.getenv("AZURE_SEARCH_KEY")),
+        api_version=api_version,
+        transport=_search_transport(),
+        **_search_options()
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_search_index_client(endpoint: Optional[str] = None, key: Optional[str] = None,
+                            api_version: str = SEARCH_API_VERSION) -> 'SearchIndexClient':
+    """Shared Azure AI Search index management client per endpoint."""
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.indexes import SearchIndexClient
+    return SearchIndexClient(
+        endpoint=endpoint or os.getenv("AZURE_SEARCH_ENDPOINT"),
+        credential=AzureKeyCredential(key or os.getenv("AZURE_SEARCH_KEY")),
+        api_version=api_version,
+        transport=_search_transport(),
+        **_search_options()
+    )
+
+def create_async_search_client(index_name: str, endpoint: Optional[str] = None, key: Optional[str] = None,
+                               api_version: str = SEARCH_API_VERSION) -> 'AsyncSearchClient':
+    """New async Azure AI Search client with the shared timeouts and retry policy; use with `async with`."""
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+    return AsyncSearchClient(
+        endpoint=endpoint or os.getenv("AZURE_SEARCH_ENDPOINT"),
+        index_name=index_name,
+        credential=AzureKeyCredential(key or os.getenv("AZURE_SEARCH_KEY")),
+        api_version=api_version,
+        **_search_options()
+    )
+
+def search_in_filter(field: str, values: Sequence[str]) -> str:
+    """
+    OData `search.in` filter matching any of values, e.g. the source files of a search.
+
+    Quotes are escaped as '' and the delimiter is one that occurs in none of
+    the values, so names containing ' or | are matched as they are.
+    """
+    values = list(values)
+    delimiter = next((candidate for candidate in SEARCH_IN_DELIMITERS if not any(candidate in value for value in values)), None)
+    if delimiter is None:
+        raise ValueError(f"No search.in delimiter is free for the values {values}")
+    joined = delimiter.join(value.replace("'", "''") for value in values)
+    return f"search.in({field}, '{joined}', '{delimiter}')"
+
+def _error_status(error: Exception) -> Optional[int]:
+    # Both openai.APIStatusError and azure.core HttpResponseError carry the HTTP status here
+    status = getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether a failed call may succeed when repeated.
+
+    Throttling, timeouts, dropped connections and server errors are
+    retryable; bad requests, authentication and not-found errors are not.
+    """
+    from openai import APIConnectionError
+    from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+    # APITimeoutError is a subclass of APIConnectionError
+    if isinstance(error, (APIConnectionError, ServiceRequestError, ServiceResponseError)):
+        return True
+    return _error_status(error) in RETRYABLE_STATUS
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the service asked to wait, from the Retry-After(-ms) headers of a failed response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def call_with_retries(function: Callable[..., Any], *args, max_retries: int = MAX_RETRIES, **kwargs) -> Any:
+    """
+    Call a function, retrying retryable errors with exponential backoff.
+
+    A Retry-After header on a throttled response takes precedence over the
+    backoff delay. Non-retryable errors are raised immediately.
+    """
+    attempt = 0
+    while True:
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            attempt += 1
+            delay = retry_after(e)
+            if delay is None:
+                delay = RETRY_BACKOFF * 2 ** (attempt - 1) * (1 + random.random())
+            delay = min(delay, MAX_RETRY_DELAY)
+            logging.warning(f"{getattr(function, '__qualname__', 'Call')} failed ({_error_status(e) or type(e).__name__}), "
+                            f"retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+def with_retries(function: Callable[..., Any]) -> Callable[..., Any]:
+    """Decorator form of call_with_retries."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return call_with_retries(function, *args, **kwargs)
+    return wrapper
+
+def chat_completion(openai_client, rate_limiter=None, **kwargs):
+    """
+    client.chat.completions.create with rate-limit-aware retries, traced with its token usage.
+
+    When a rate_limiter (e.g. a SharedRateLimiter) is given, a slot is
+    acquired before every attempt, retries included, so the limiter counts
+    the requests actually sent.
+    """
+    def create(**request):
+        if rate_limiter is not None:
+            with span("rate_limit_wait", "llm"):
+                rate_limiter.acquire()
+        return openai_client.chat.completions.create(**request)
+
+    with span("chat_completion", "llm", model=kwargs.get("model")) as current:
+        response = call_with_retries(create, **kwargs)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            current.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        return response
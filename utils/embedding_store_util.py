@@ -0,0 +1,136 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+# Location of locally stored embeddings, one directory per model and dimension
+EMBEDDING_STORE_DIR = os.path.join(".cache", "embeddings")
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.txt"
+META_FILE = "meta.json"
+
+def text_key(text: str) -> str:
+    """SHA-256 of a text, used as its key in the store."""
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+class EmbeddingStore:
+    """
+    Local store of embeddings for one (model, dimension), keyed on text hash.
+
+    Vectors are appended to a raw float32 file that is read through a
+    memory map, so looking up a vector touches only its own row. The row of
+    every key is listed in a text file with one SHA-256 per line, loaded
+    into a dict when the store is opened. Vectors are written before their
+    keys, so an interrupted write leaves at most unreferenced rows, which
+    are ignored on the next open and truncated before the next write.
+
+    The store is safe to use from several threads of one process; separate
+    processes should not write to the same store at the same time.
+    """
+
+    def __init__(self, model: str, dimension: int, store_dir: str = EMBEDDING_STORE_DIR):
+        self.model = model
+        self.dimension = dimension
+        self.path = os.path.join(store_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", f"{model}-{dimension}"))
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._matrix = None
+        self._consistent = True
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, text: str) -> bool:
+        return text_key(text) in self._rows
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, VECTORS_FILE)
+
+    def _load(self):
+        keys_path = os.path.join(self.path, KEYS_FILE)
+        if not os.path.exists(keys_path):
+            return
+        row_bytes = self.dimension * np.dtype(np.float32).itemsize
+        stored_rows = os.path.getsize(self._vectors_path()) // row_bytes if os.path.exists(self._vectors_path()) else 0
+        with open(keys_path, 'r') as f:
+            for row, line in enumerate(f):
+                key = line.strip()
+                if row >= stored_rows or len(key) != 64:
+                    logging.warning(f"Embedding store {self.path} is incomplete, ignoring rows from {row}")
+                    self._consistent = False
+                    break
+                self._rows[key] = row
+        if stored_rows > len(self._rows):
+            self._consistent = False
+
+    def _repair(self):
+        """Rewrite the files to exactly the loaded rows before appending to them."""
+        row_bytes = self.dimension * np.dtype(np.float32).itemsize
+        os.truncate(self._vectors_path(), len(self._rows) * row_bytes)
+        keys = sorted(self._rows, key=self._rows.get)
+        with open(os.path.join(self.path, KEYS_FILE), 'w') as f:
+            f.write("".join(f"{key}\n" for key in keys))
+        self._consistent = True
+
+    def _get_matrix(self) -> np.ndarray:
+        # Re-map after appends so new rows become visible
+        if self._matrix is None or len(self._matrix) < len(self._rows):
+            self._matrix = np.memmap(self._vectors_path(), dtype=np.float32, mode='r',
+                                     shape=(len(self._rows), self.dimension))
+        return self._matrix
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up the embeddings of several texts.
+
+        Returns:
+            List[Optional[np.ndarray]]: A float32 vector per text, or None if not stored.
+        """
+        with self._lock:
+            rows = [self._rows.get(text_key(text)) for text in texts]
+            if all(row is None for row in rows):
+                return [None] * len(texts)
+            matrix = self._get_matrix()
+            return [None if row is None else np.array(matrix[row]) for row in rows]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Store the embeddings of several texts; texts already stored are skipped."""
+        with self._lock:
+            new_keys, new_vectors = {}, []
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                if key in self._rows or key in new_keys:
+                    continue
+                new_keys[key] = len(new_vectors)
+                new_vectors.append(vector)
+            if not new_keys:
+                return
+
+            matrix = np.asarray(new_vectors, dtype=np.float32)
+            if matrix.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got {matrix.shape[1]}")
+
+            if not self._rows:
+                os.makedirs(self.path, exist_ok=True)
+                with open(os.path.join(self.path, META_FILE), 'w') as f:
+                    json.dump({"model": self.model, "dimension": self.dimension}, f)
+                # Start from a clean slate, dropping rows left behind by an interrupted write
+                open(self._vectors_path(), 'wb').close()
+                open(os.path.join(self.path, KEYS_FILE), 'w').close()
+            elif not self._consistent:
+                self._repair()
+
+            with open(self._vectors_path(), 'ab') as f:
+                f.write(matrix.tobytes())
+            with open(os.path.join(self.path, KEYS_FILE), 'a') as f:
+                f.write("".join(f"{key}\n" for key in new_keys))
+            for key in new_keys:
+                self._rows[key] = len(self._rows)
@@ -0,0 +1,188 @@
+import os
+import gzip
+import json
+import time
+import logging
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Location of cached document text extracted for indexing
+EXTRACTION_CACHE_DIR = os.path.join(".cache", "extraction")
+MAX_CACHE_BYTES = 512 * 1024 * 1024  # Least recently used entries are evicted beyond this size
+# Bump when the readers in tasks/create_index.py change their output, so stale text is not reused
+EXTRACTOR_VERSION = 1
+CACHE_SUFFIX = ".jsonl.gz"
+
+class ExtractionCache:
+    """
+    On-disk cache of extracted document text, keyed on file content hash.
+
+    Each entry is a gzip-compressed JSON-lines file holding the
+    (page number, text) pairs produced by iter_document_pages for one file.
+    The key combines the SHA-256 of the file with EXTRACTOR_VERSION, so a
+    changed file or a changed reader misses the cache. Entries are written
+    to a temporary file and renamed, so an interrupted run never leaves a
+    partial entry behind. Reads refresh an entry's modification time, which
+    drives least-recently-used eviction once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = EXTRACTION_CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES,
+                 version: int = EXTRACTOR_VERSION):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = version
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}-v{self.version}{CACHE_SUFFIX}")
+
+    def contains(self, content_hash: str) -> bool:
+        return os.path.exists(self.path(content_hash))
+
+    def iter_pages(self, content_hash: str) -> Optional[Iterator[Tuple[int, str]]]:
+        """
+        Stream the cached pages of a file.
+
+        Returns:
+            Optional[Iterator[Tuple[int, str]]]: (page number, text) pairs,
+            or None if the file is not cached.
+        """
+        path = self.path(content_hash)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return self._read(path)
+
+    def get(self, content_hash: str) -> Optional[List[Tuple[int, str]]]:
+        """All cached pages of a file, or None if it is not cached or unreadable."""
+        pages = self.iter_pages(content_hash)
+        if pages is None:
+            return None
+        try:
+            return list(pages)
+        except (OSError, EOFError, ValueError) as e:
+            logging.warning(f"Dropping unreadable extraction cache entry {self.path(content_hash)}: {e}")
+            self._remove(self.path(content_hash))
+            return None
+
+    def put(self, content_hash: str, pages: Iterable[Tuple[int, str]]):
+        """Store the pages of a file, replacing any existing entry."""
+        for _ in self.write_through(content_hash, pages):
+            pass
+
+    def write_through(self, content_hash: str, pages: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+        """
+        Yield pages while writing them to the cache.
+
+        The entry is only committed once the pages are exhausted, so a
+        consumer that stops early leaves the cache unchanged.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(content_hash)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        committed = False
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                for page_number, text in pages:
+                    f.write(json.dumps([page_number, text]) + "\n")
+                    yield page_number, text
+            os.replace(tmp_path, path)
+            committed = True
+        finally:
+            if not committed:
+                self._remove(tmp_path)
+        self.evict()
+
+    def entries(self) -> List[Dict]:
+        """Cache entries, most recently used first."""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            content_hash, _, version = name[:-len(CACHE_SUFFIX)].rpartition("-v")
+            entries.append({
+                "hash": content_hash,
+                "version": int(version) if version.isdigit() else None,
+                "bytes": stat.st_size,
+                "last_used": stat.st_mtime,
+                "path": path
+            })
+        return sorted(entries, key=lambda entry: entry["last_used"], reverse=True)
+
+    def stats(self) -> Dict:
+        entries = self.entries()
+        return {
+            "cache_dir": self.cache_dir,
+            "entries": len(entries),
+            "stale_entries": sum(1 for entry in entries if entry["version"] != self.version),
+            "bytes": sum(entry["bytes"] for entry in entries),
+            "max_bytes": self.max_bytes
+        }
+
+    def evict(self) -> int:
+        """
+        Remove entries from other extractor versions, then the least recently
+        used ones until the cache fits in max_bytes.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        removed = 0
+        total = 0
+        for entry in self.entries():
+            if entry["version"] != self.version or total + entry["bytes"] > self.max_bytes:
+                self._remove(entry["path"])
+                removed += 1
+            else:
+                total += entry["bytes"]
+        if removed:
+            logging.info(f"Evicted {removed} extraction cache entries from {self.cache_dir}")
+        return removed
+
+    def clear(self) -> int:
+        entries = self.entries()
+        for entry in entries:
+            self._remove(entry["path"])
+        return len(entries)
+
+    def _read(self, path: str) -> Iterator[Tuple[int, str]]:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                page_number, text = json.loads(line)
+                yield page_number, text
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the document extraction cache.")
+    parser.add_argument("command", choices=["stats", "list", "clear", "evict"], help="Action to perform")
+    parser.add_argument("--cache-dir", default=EXTRACTION_CACHE_DIR, help="Cache directory")
+    parser.add_argument("--max-mb", type=float, default=MAX_CACHE_BYTES / (1024 * 1024), help="Size limit used by evict")
+    args = parser.parse_args()
+
+    cache = ExtractionCache(args.cache_dir, int(args.max_mb * 1024 * 1024))
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.command == "list":
+        for entry in cache.entries():
+            last_used = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['last_used']))
+            print(f"{entry['hash']}  v{entry['version']}  {entry['bytes'] / 1024:>10.1f} KB  {last_used}")
+    elif args.command == "clear":
+        print(f"Removed {cache.clear()} entries from {args.cache_dir}")
+    elif args.command == "evict":
+        print(f"Removed {cache.evict()} entries from {args.cache_dir}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,391 @@
+import os
+import re
+import pickle
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Any
+
+from utils.telemetry_util import format_gains_map
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Location of compiled gains map indexes
+GAINS_INDEX_CACHE_DIR = os.path.join(".cache", "gains_index")
+# Bump when the compiled layout changes so stale caches are rebuilt
+GAINS_INDEX_VERSION = 1
+
+# Columns of the formatted gains map kept in the compiled index
+INDEX_COLUMNS = ['Variable Type', 'Variable Name', 'TYPE', 'MVDVNAME', 'MVDVAPETTAG', 'GAIN-VALUE']
+
+# Controller variable key embedded in APC tags, e.g. "...PROFIT_AVERAGE_BIN_LEVEL.TARGET"
+PROFIT_VARIABLE_PATTERN = re.compile(r'PROFIT_([A-Z0-9_]+)')
+
+def load_gains_map(file_path: str) -> pd.DataFrame:
+    """
+    Load a raw gains map export from a CSV or XLSX file.
+
+    Args:
+        file_path (str): Path to the gains map file.
+
+    Returns:
+        pd.DataFrame: Raw gains map with the original export columns.
+    """
+    extension = file_path.lower().split('.')[-1]
+    logging.info(f"Loading gains map from {file_path}")
+    if extension == 'csv':
+        return pd.read_csv(file_path)
+    elif extension == 'xlsx':
+        return pd.read_excel(file_path)
+    else:
+        raise ValueError(f"Unsupported gains map extension: {extension}")
+
+def variable_key(tag: str) -> Optional[str]:
+    """Extract the controller variable key (e.g. AVERAGE_BIN_LEVEL) from an APC tag."""
+    match = PROFIT_VARIABLE_PATTERN.search(tag)
+    return match.group(1) if match else None
+
+class GainsMapIndex:
+    """
+    Compiled lookup structure over a formatted gains map.
+
+    Rows are stored column-wise as NumPy arrays and every CV tag, CV variable
+    key and MV/DV tag maps to the array of row positions it appears in, so
+    lookups by either side of the gain relationship are a single dict access.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], by_cv: Dict[str, np.ndarray],
+                 by_mvdv: Dict[str, np.ndarray]):
+        self.columns = columns
+        self.by_cv = by_cv
+        self.by_mvdv = by_mvdv
+
+    def __len__(self) -> int:
+        return len(self.columns['GAIN-VALUE'])
+
+    @classmethod
+    def from_frame(cls, formatted_df: pd.DataFrame, drop_zero_gains: bool = True) -> 'GainsMapIndex':
+        """
+        Compile an index from the output of format_gains_map.
+
+        Args:
+            formatted_df (pd.DataFrame): Formatted gains map.
+            drop_zero_gains (bool): Skip rows whose gain is missing or zero.
+
+        Returns:
+            GainsMapIndex: The compiled index.
+        """
+        df = formatted_df[INDEX_COLUMNS]
+        gains = pd.to_numeric(df['GAIN-VALUE'], errors='coerce').to_numpy(dtype=np.float64)
+        keep = np.isfinite(gains)
+        if drop_zero_gains:
+            keep &= gains != 0
+        df = df[keep]
+        logging.info(f"Compiling gains index from {len(df)} of {len(keep)} rows")
+
+        columns = {col: df[col].astype(str).to_numpy(dtype=object) for col in INDEX_COLUMNS if col != 'GAIN-VALUE'}
+        columns['GAIN-VALUE'] = gains[keep]
+
+        by_cv: Dict[str, List[int]] = {}
+        by_mvdv: Dict[str, List[int]] = {}
+        for position, (cv_name, cv_tag, mvdv_tag) in enumerate(zip(columns['Variable Type'],
+                                                                    columns['Variable Name'],
+                                                                    columns['MVDVAPETTAG'])):
+            by_cv.setdefault(cv_tag, []).append(position)
+            cv_key = cv_name.upper()
+            if cv_key != cv_tag:
+                by_cv.setdefault(cv_key, []).append(position)
+            by_mvdv.setdefault(mvdv_tag, []).append(position)
+
+        return cls(
+            columns,
+            {key: np.asarray(rows, dtype=np.int32) for key, rows in by_cv.items()},
+            {key: np.asarray(rows, dtype=np.int32) for key, rows in by_mvdv.items()},
+        )
+
+    def rows_for_cv(self, tag: str) -> np.ndarray:
+        """Row positions for a CV tag or CV variable key."""
+        return self.by_cv.get(tag, np.empty(0, dtype=np.int32))
+
+    def rows_for_mvdv(self, tag: str) -> np.ndarray:
+        """Row positions for an MV/DV tag."""
+        return self.by_mvdv.get(tag, np.empty(0, dtype=np.int32))
+
+    def lookup(self, tag: str) -> np.ndarray:
+        """
+        Resolve any tag to its gains rows.
+
+        Tries the tag as a CV tag, then as an MV/DV tag, then falls back to
+        the PROFIT_<VARIABLE> key embedded in APC tags.
+
+        Args:
+            tag (str): CV, MV/DV or APC tag name.
+
+        Returns:
+            np.ndarray: Row positions, empty if the tag is unknown.
+        """
+        rows = self.by_cv.get(tag)
+        if rows is None:
+            rows = self.by_mvdv.get(tag)
+        if rows is None:
+            key = variable_key(tag)
+            rows = self.by_cv.get(key) if key else None
+        return rows if rows is not None else np.empty(0, dtype=np.int32)
+
+    def records(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """Materialize row positions as formatted gains map records."""
+        return [
+            {col: (float(values[row]) if col == 'GAIN-VALUE' else values[row]) for col, values in self.columns.items()}
+            for row in rows
+        ]
+
+def _file_digest(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def build_gains_index(file_path: str, cv_tag_filter: Optional[str] = None,
+                      gain_tag_filter: Optional[str] = None,
+                      cache_dir: str = GAINS_INDEX_CACHE_DIR) -> GainsMapIndex:
+    """
+    Build a gains map index from a CSV/XLSX export, reusing the on-disk cache.
+
+    The cache is keyed on the file contents, the filters and the index
+    version, so it is rebuilt automatically when any of them change.
+
+    Args:
+        file_path (str): Path to the gains map export.
+        cv_tag_filter (str, optional): Restrict to CV tags containing this value.
+        gain_tag_filter (str, optional): Restrict to gain tags containing this value.
+        cache_dir (str): Directory holding compiled indexes.
+
+    Returns:
+        GainsMapIndex: The compiled index.
+    """
+    cache_key = hashlib.sha256(
+        f"{_file_digest(file_path)}|{cv_tag_filter}|{gain_tag_filter}|{GAINS_INDEX_VERSION}".encode()
+    ).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{cache_key}.pkl")
+
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                index = pickle.load(f)
+            logging.info(f"Loaded cached gains index from {cache_path}")
+            return index
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable gains index cache {cache_path}: {e}")
+
+    formatted_df = format_gains_map(load_gains_map(file_path), cv_tag_filter=cv_tag_filter,
+                                    gain_tag_filter=gain_tag_filter)
+    index = GainsMapIndex.from_frame(formatted_df)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    logging.info(f"Cached gains index with {len(index)} rows at {cache_path}")
+    return index
+
+class GainMatrix:
+    """
+    Sparse CV x MV/DV gain matrix in CSR layout.
+
+    Rows are controlled variables (keyed by CV name), columns are MV/DV tags.
+    Queries are vectorized over the non-zero gains so ranking and what-if
+    evaluation stay cheap for any number of violations.
+    """
+
+    def __init__(self, cv_names: np.ndarray, cv_tags: np.ndarray, mvdv_tags: np.ndarray,
+                 mvdv_names: np.ndarray, mvdv_types: np.ndarray, indptr: np.ndarray,
+                 indices: np.ndarray, data: np.ndarray):
+        self.cv_names = cv_names
+        self.cv_tags = cv_tags
+        self.mvdv_tags = mvdv_tags
+        self.mvdv_names = mvdv_names
+        self.mvdv_types = mvdv_types
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.mvdv_positions = {tag: col for col, tag in enumerate(mvdv_tags)}
+
+        # CV tags and variable keys resolve to one or more matrix rows
+        cv_lookup: Dict[str, List[int]] = {}
+        for row, (name, tag) in enumerate(zip(cv_names, cv_tags)):
+            cv_lookup.setdefault(name.upper(), []).append(row)
+            cv_lookup.setdefault(tag, []).append(row)
+        self.cv_lookup = {key: np.asarray(rows, dtype=np.int32) for key, rows in cv_lookup.items()}
+
+    @property
+    def shape(self):
+        return len(self.cv_names), len(self.mvdv_tags)
+
+    @classmethod
+    def from_index(cls, index: GainsMapIndex) -> 'GainMatrix':
+        """Build the matrix from a compiled GainsMapIndex."""
+        columns = index.columns
+        cv_names, cv_first, cv_codes = np.unique(columns['Variable Type'], return_index=True, return_inverse=True)
+        mvdv_tags, first_seen, mvdv_codes = np.unique(columns['MVDVAPETTAG'], return_index=True, return_inverse=True)
+
+        order = np.lexsort((mvdv_codes, cv_codes))
+        indptr = np.zeros(len(cv_names) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(cv_codes, minlength=len(cv_names)), out=indptr[1:])
+
+        return cls(
+            cv_names=cv_names,
+            cv_tags=columns['Variable Name'][cv_first],
+            mvdv_tags=mvdv_tags,
+            mvdv_names=columns['MVDVNAME'][first_seen],
+            mvdv_types=columns['TYPE'][first_seen],
+            indptr=indptr,
+            indices=mvdv_codes[order].astype(np.int32),
+            data=columns['GAIN-VALUE'][order].astype(np.float64),
+        )
+
+    @classmethod
+    def from_frame(cls, formatted_df: pd.DataFrame) -> 'GainMatrix':
+        """Build the matrix from the output of format_gains_map."""
+        return cls.from_index(GainsMapIndex.from_frame(formatted_df))
+
+    def resolve(self, tag: str) -> np.ndarray:
+        """Matrix rows for a CV name, CV tag or APC tag, empty if unknown."""
+        rows = self.cv_lookup.get(tag)
+        if rows is None:
+            key = variable_key(tag)
+            rows = self.cv_lookup.get(key) if key else None
+        return rows if rows is not None else np.empty(0, dtype=np.int32)
+
+    def top_influencers_batch(self, rows: np.ndarray, k: int = 5):
+        """
+        Rank the MV/DVs with the largest absolute gain for many CVs at once.
+
+        Args:
+            rows (np.ndarray): Matrix rows to rank.
+            k (int): Number of influencers per row.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Column indices and gains, both of
+            shape (len(rows), k). Missing entries have column -1 and gain 0.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        width = int(lengths.max()) if len(rows) else 0
+        columns = np.full((len(rows), k), -1, dtype=np.int32)
+        gains = np.zeros((len(rows), k), dtype=np.float64)
+        if width == 0:
+            return columns, gains
+
+        # Pad each CSR row to a common width so ranking is one argsort
+        offsets = np.arange(width)
+        valid = offsets[None, :] < lengths[:, None]
+        positions = np.where(valid, starts[:, None] + offsets[None, :], 0)
+        magnitude = np.where(valid, np.abs(self.data[positions]), -np.inf)
+        ranked = np.argsort(-magnitude, axis=1, kind='stable')[:, :k]
+        ranked_positions = np.take_along_axis(positions, ranked, axis=1)
+        ranked_valid = np.take_along_axis(valid, ranked, axis=1)
+
+        span = ranked.shape[1]
+        columns[:, :span] = np.where(ranked_valid, self.indices[ranked_positions], -1)
+        gains[:, :span] = np.where(ranked_valid, self.data[ranked_positions], 0.0)
+        return columns, gains
+
+    def top_influencers(self, tag: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Top-k MV/DVs by absolute gain for the CV(s) a tag resolves to.
+
+        Args:
+            tag (str): CV name, CV tag or APC tag.
+            k (int): Number of influencers per CV.
+
+        Returns:
+            List[Dict[str, Any]]: One record per influencer, strongest first.
+        """
+        rows = self.resolve(tag)
+        columns, gains = self.top_influencers_batch(rows, k)
+        return [
+            {
+                'Variable Type': self.cv_names[row],
+                'Variable Name': self.cv_tags[row],
+                'MVDVAPETTAG': self.mvdv_tags[col],
+                'MVDVNAME': self.mvdv_names[col],
+                'TYPE': self.mvdv_types[col],
+                'GAIN-VALUE': float(gain),
+            }
+            for row, row_columns, row_gains in zip(rows, columns, gains)
+            for col, gain in zip(row_columns, row_gains) if col >= 0
+        ]
+
+    def move_vector(self, moves: Dict[str, float]) -> np.ndarray:
+        """Convert a {MV/DV tag: move} mapping into a dense move vector."""
+        vector = np.zeros(len(self.mvdv_tags), dtype=np.float64)
+        for tag, move in moves.items():
+            col = self.mvdv_positions.get(tag)
+            if col is None:
+                logging.warning(f"Ignoring move for unknown MV/DV tag: {tag}")
+                continue
+            vector[col] = move
+        return vector
+
+    def predict_deltas(self, moves: np.ndarray) -> np.ndarray:
+        """
+        Predicted steady-state CV deltas for one or more MV/DV move vectors.
+
+        Args:
+            moves (np.ndarray): Move vector of shape (n_mvdv,) or a batch of
+                scenarios of shape (n_scenarios, n_mvdv).
+
+        Returns:
+            np.ndarray: CV deltas of shape (n_cv,) or (n_scenarios, n_cv).
+        """
+        moves = np.asarray(moves, dtype=np.float64)
+        batch = np.atleast_2d(moves)
+        deltas = np.zeros((batch.shape[0], len(self.cv_names)), dtype=np.float64)
+        non_empty = np.diff(self.indptr) > 0
+        if non_empty.any():
+            contributions = batch[:, self.indices] * self.data
+            deltas[:, non_empty] = np.add.reduceat(contributions, self.indptr[:-1][non_empty], axis=1)
+        return deltas if moves.ndim > 1 else deltas[0]
+
+    def _format_shortlist(self, rows: np.ndarray, columns: np.ndarray, gains: np.ndarray) -> str:
+        lines = []
+        for row, row_columns, row_gains in zip(rows, columns, gains):
+            lines.append(f"Strongest influences on {self.cv_names[row]} ({self.cv_tags[row]}):")
+            lines.extend(
+                f"- {self.mvdv_names[col]} ({self.mvdv_tags[col]}, {self.mvdv_types[col]}): gain {gain:+.4g}"
+                for col, gain in zip(row_columns, row_gains) if col >= 0
+            )
+        return "\n".join(lines)
+
+    def shortlist(self, tag: str, k: int = 5) -> str:
+        """Format the top-k influencers of a tag as compact prompt context."""
+        rows = self.resolve(tag)
+        return self._format_shortlist(rows, *self.top_influencers_batch(rows, k))
+
+    def shortlist_batch(self, tags: List[str], k: int = 5) -> Dict[str, str]:
+        """
+        Format shortlists for many tags with a single ranking pass.
+
+        Args:
+            tags (List[str]): Tags to build prompt context for, e.g. one per violation.
+            k (int): Number of influencers per CV.
+
+        Returns:
+            Dict[str, str]: Shortlist text per distinct tag, empty if the tag is unknown.
+        """
+        unique_tags = list(dict.fromkeys(tags))
+        resolved = [self.resolve(tag) for tag in unique_tags]
+        rows = np.concatenate(resolved) if resolved else np.empty(0, dtype=np.int32)
+        columns, gains = self.top_influencers_batch(rows, k)
+
+        shortlists = {}
+        offset = 0
+        for tag, tag_rows in zip(unique_tags, resolved):
+            end = offset + len(tag_rows)
+            shortlists[tag] = self._format_shortlist(tag_rows, columns[offset:end], gains[offset:end])
+            offset = end
+        return shortlists
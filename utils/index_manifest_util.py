@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, List, Optional, Any
+
+# Location of per-index manifests used for incremental re-indexing
+MANIFEST_DIR = os.path.join(".cache", "manifests")
+
+def hash_file(file_path: str) -> str:
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_schema(index: Any) -> str:
+    """Stable hash of a SearchIndex definition."""
+    definition = index.as_dict() if hasattr(index, 'as_dict') else index
+    return hashlib.sha256(json.dumps(definition, sort_keys=True, default=str).encode()).hexdigest()
+
+class IndexManifest:
+    """
+    Local record of what has been uploaded to one search index.
+
+    For every document the manifest keeps the content hash it was indexed
+    from and the ids of the chunks uploaded for it, together with the hash of
+    the index schema. Comparing against the current files tells an
+    incremental run which documents to re-process and which chunks to delete.
+    """
+
+    def __init__(self, index_name: str, manifest_dir: str = MANIFEST_DIR):
+        self.index_name = index_name
+        self.path = os.path.join(manifest_dir, f"{index_name}.json")
+        self.schema_hash: Optional[str] = None
+        self.documents: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, index_name: str, manifest_dir: str = MANIFEST_DIR) -> 'IndexManifest':
+        """Load the manifest of an index, or an empty one if none exists."""
+        manifest = cls(index_name, manifest_dir)
+        if os.path.exists(manifest.path):
+            try:
+                with open(manifest.path, 'r') as f:
+                    data = json.load(f)
+                manifest.schema_hash = data.get('schema_hash')
+                manifest.documents = data.get('documents', {})
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable manifest {manifest.path}: {e}")
+        return manifest
+
+    def reset(self, schema_hash: str):
+        """Forget all documents, e.g. after the index was recreated."""
+        self.schema_hash = schema_hash
+        self.documents = {}
+
+    def changed_documents(self, document_hashes: Dict[str, str]) -> List[str]:
+        """Documents that are new or whose content hash differs from the manifest."""
+        return [
+            document for document, content_hash in document_hashes.items()
+            if self.documents.get(document, {}).get('hash') != content_hash
+        ]
+
+    def removed_documents(self, documents: List[str]) -> List[str]:
+        """Documents in the manifest that are no longer configured for the index."""
+        current = set(documents)
+        return [document for document in self.documents if document not in current]
+
+    def chunk_ids(self, document: str) -> List[str]:
+        return list(self.documents.get(document, {}).get('chunk_ids', []))
+
+    def record(self, document: str, content_hash: str, chunk_ids: List[str]):
+        self.documents[document] = {'hash': content_hash, 'chunk_ids': list(chunk_ids)}
+
+    def mark_failed(self, document: str, chunk_ids: List[str]):
+        """
+        Record a document whose upload failed, so the next incremental run retries it.
+
+        The hash is cleared to mark the document as changed. The previous and
+        the new chunk ids are kept, because both may be in the index, and the
+        retry deletes every one of them that it does not upload again.
+        """
+        previous = self.chunk_ids(document)
+        self.documents[document] = {'hash': None, 'chunk_ids': previous + [chunk_id for chunk_id in chunk_ids if chunk_id not in previous]}
+
+    def forget(self, document: str):
+        self.documents.pop(document, None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'schema_hash': self.schema_hash, 'documents': self.documents}, f, indent=2)
+        os.replace(tmp_path, self.path)
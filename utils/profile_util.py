@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Sequence
+
+# Modules whose cold import cost is profiled on the debug page
+PROFILED_MODULES = ("streamlit", "requests", "pandas", "utils.api_util")
+MAX_RERUN_SAMPLES = 200  # Rerun timings kept per page
+PROCESS_STARTED = time.time()
+
+_rerun_samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=MAX_RERUN_SAMPLES))
+_rerun_lock = threading.Lock()
+
+class RerunTimer:
+    """
+    Wall time of one run of a Streamlit page script.
+
+    Start one at the top of a page and stop it at the end; runs cut short
+    by st.rerun() or st.stop() are not recorded.
+
+        timer = RerunTimer("Home")
+        ...
+        timer.stop()
+    """
+
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.perf_counter()
+
+    def stop(self) -> float:
+        seconds = time.perf_counter() - self.started
+        record_rerun(self.page, seconds)
+        return seconds
+
+def record_rerun(page: str, seconds: float):
+    with _rerun_lock:
+        _rerun_samples[page].append(seconds)
+
+def rerun_stats() -> List[Dict]:
+    """Per page: number of recorded runs and the last, mean and 95th percentile time in milliseconds."""
+    with _rerun_lock:
+        samples = {page: list(times) for page, times in _rerun_samples.items()}
+    stats = []
+    for page, times in sorted(samples.items()):
+        ordered = sorted(times)
+        stats.append({
+            "page": page,
+            "runs": len(times),
+            "last_ms": round(times[-1] * 1000, 1),
+            "mean_ms": round(sum(times) / len(times) * 1000, 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 1)
+        })
+    return stats
+
+def import_profile(modules: Sequence[str] = PROFILED_MODULES, top_n: Optional[int] = 25) -> List[Dict]:
+    """
+    Cold import times of modules, measured in a fresh interpreter.
+
+    Runs `python -X importtime` in a subprocess from the app directory, so
+    the numbers reflect a restarted instance and are not hidden by modules
+    this process has already imported.
+
+    Returns:
+        List[Dict]: Modules by cumulative import time, slowest first, with
+        their own ("self_ms") and cumulative ("cumulative_ms") time and the
+        depth at which they were first imported.
+    """
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(f"import {module}" for module in modules)],
+        cwd=app_dir, capture_output=True, text=True, timeout=120
+    )
+    profile = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        name = module.strip()
+        profile.append({
+            "module": name,
+            "depth": (len(module.rstrip()) - len(name) - 1) // 2,  # Nesting level of the import
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000
+        })
+    profile.sort(key=lambda entry: entry["cumulative_ms"], reverse=True)
+    return profile[:top_n] if top_n else profile
@@ -0,0 +1,80 @@
+import time
+import logging
+import threading
+
+class SharedRateLimiter:
+    """
+    Requests-per-minute limiter shared by several worker processes.
+
+    Slots are handed out from a counter held by a multiprocessing Manager, so
+    every process that receives the limiter draws from the same budget. The
+    limiter itself is picklable and can be passed to ProcessPoolExecutor jobs.
+    """
+
+    def __init__(self, manager, requests_per_minute: float):
+        """
+        Args:
+            manager: A started multiprocessing Manager.
+            requests_per_minute (float): Combined request budget for all processes.
+        """
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        self.interval = 60.0 / requests_per_minute
+        self._lock = manager.Lock()
+        self._next_slot = manager.Value('d', 0.0)
+
+    def acquire(self) -> float:
+        """
+        Block until the caller may send its next request.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self.interval
+        delay = slot - time.time()
+        if delay > 0:
+            logging.debug(f"Rate limit reached, waiting {delay:.2f}s")
+            time.sleep(delay)
+            return delay
+        return 0.0
+
+class TokenRateLimiter:
+    """
+    Tokens-per-minute limiter for the threads of one process.
+
+    Each request reserves time in proportion to its token count, so large
+    and small requests share the budget fairly and the combined rate stays
+    at or below tokens_per_minute.
+    """
+
+    def __init__(self, tokens_per_minute: float):
+        """
+        Args:
+            tokens_per_minute (float): Token budget for all threads.
+        """
+        if tokens_per_minute <= 0:
+            raise ValueError("tokens_per_minute must be positive")
+        self.seconds_per_token = 60.0 / tokens_per_minute
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Block until a request of `tokens` tokens may be sent.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + tokens * self.seconds_per_token
+        delay = slot - time.time()
+        if delay > 0:
+            logging.debug(f"Token rate limit reached, waiting {delay:.2f}s")
+            time.sleep(delay)
+            return delay
+        return 0.0
@@ -0,0 +1,201 @@
+import json
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from azure.core.exceptions import AzureError, HttpResponseError, ServiceRequestError, ServiceResponseError
+from utils.trace_util import span, bind_context
+
+# Azure AI Search accepts at most 1000 documents and 16 MB per indexing request
+MAX_BATCH_DOCUMENTS = 1000
+MAX_BATCH_BYTES = 15 * 1024 * 1024  # Keep a margin below the 16 MB request limit
+MAX_CONCURRENT_BATCHES = 4  # Batches uploaded at the same time
+MAX_RETRIES = 3  # Retries for documents or requests that failed transiently
+# Per-document status codes worth retrying: version conflict, index busy, service unavailable
+RETRYABLE_DOCUMENT_STATUS = {409, 422, 503}
+RETRYABLE_REQUEST_STATUS = {408, 429, 500, 502, 503, 504}
+
+class BatchUploader:
+    """
+    Buffered, concurrent document uploader for one Azure AI Search index.
+
+    Documents are buffered and sent as a batch whenever the next document
+    would exceed the count or serialized size limit. Batches are uploaded
+    from a small thread pool; at most twice that many batches are pending,
+    so add() blocks instead of buffering without bound. Documents that fail
+    with a transient status are retried on their own, never the whole batch.
+
+    Use as a context manager, or call close() to flush and get the report:
+
+        with BatchUploader(search_client) as uploader:
+            for document in documents:
+                uploader.add(document)
+        print(uploader.report)
+    """
+
+    def __init__(
+        self,
+        search_client,
+        key_field: str = "id",
+        max_batch_documents: int = MAX_BATCH_DOCUMENTS,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        max_concurrency: int = MAX_CONCURRENT_BATCHES,
+        max_retries: int = MAX_RETRIES
+    ):
+        self.search_client = search_client
+        self.key_field = key_field
+        self.max_batch_documents = max_batch_documents
+        self.max_batch_bytes = max_batch_bytes
+        self.max_retries = max_retries
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_bytes = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._pending = threading.BoundedSemaphore(2 * max_concurrency)
+        self._futures = []
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self.report: Dict[str, Any] = {
+            "index_name": getattr(search_client, "_index_name", None),
+            "succeeded": 0,
+            "failed": {},
+            "batches": 0,
+            "retried": 0,
+            "bytes": 0,
+            "elapsed": 0.0
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, document: Dict[str, Any]):
+        """Buffer a document, sending the current batch first if it is full."""
+        size = len(json.dumps(document, separators=(",", ":"), default=str).encode())
+        if self._buffer and (len(self._buffer) >= self.max_batch_documents
+                             or self._buffer_bytes + size > self.max_batch_bytes):
+            self.flush()
+        self._buffer.append(document)
+        self._buffer_bytes += size
+
+    def add_all(self, documents):
+        for document in documents:
+            self.add(document)
+
+    def flush(self):
+        """Send the buffered documents as one batch."""
+        if not self._buffer:
+            return
+        batch, batch_bytes = self._buffer, self._buffer_bytes
+        self._buffer, self._buffer_bytes = [], 0
+        self._pending.acquire()
+        future = self._executor.submit(bind_context(self._upload_batch), batch, batch_bytes)
+        future.add_done_callback(lambda _: self._pending.release())
+        self._futures.append(future)
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Flush, wait for every batch and return the completion report.
+
+        Returns:
+            Dict[str, Any]: Succeeded count, failed keys with their error,
+            batch and retry counts, uploaded bytes and elapsed seconds.
+        """
+        try:
+            self.flush()
+            for future in self._futures:
+                future.result()
+        finally:
+            self._futures = []
+            self._executor.shutdown(wait=True)
+        self.report["elapsed"] = round(time.time() - self._start, 2)
+        if self.report["failed"]:
+            logging.warning(f"{len(self.report['failed'])} documents failed to upload to {self.report['index_name']}")
+        return self.report
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None):
+        try:
+            delay = float(retry_after) if retry_after else None
+        except ValueError:
+            delay = None
+        if delay is None:
+            delay = min(2 ** attempt, 30) + random.random()
+        time.sleep(delay)
+
+    def _upload_batch(self, batch: List[Dict[str, Any]], batch_bytes: int):
+        with self._lock:
+            self.report["batches"] += 1
+            self.report["bytes"] += batch_bytes
+
+        attempt = 0
+        while batch:
+            try:
+                with span("upload_documents", "ingestion", documents=len(batch), attempt=attempt) as current:
+                    if attempt == 0:
+                        current.set(bytes=batch_bytes)
+                    # The client's own retries are disabled: this loop retries per document and splits oversized batches
+                    results = self.search_client.upload_documents(documents=batch, retry_total=0)
+                    current.set(succeeded=sum(1 for result in results if result.succeeded))
+            except HttpResponseError as e:
+                status = getattr(e, "status_code", None)
+                if status == 413 and len(batch) > 1:
+                    # Request too large despite the size estimate: split it
+                    middle = len(batch) // 2
+                    self._upload_batch(batch[:middle], 0)
+                    self._upload_batch(batch[middle:], 0)
+                    return
+                if status in RETRYABLE_REQUEST_STATUS and attempt < self.max_retries:
+                    attempt += 1
+                    with self._lock:
+                        self.report["retried"] += len(batch)
+                    retry_after = e.response.headers.get("Retry-After") if e.response is not None else None
+                    logging.warning(f"Upload of {len(batch)} documents failed with {status}, retry {attempt}/{self.max_retries}")
+                    self._backoff(attempt, retry_after)
+                    continue
+                self._record_failures(batch, str(e))
+                return
+            except (ServiceRequestError, ServiceResponseError) as e:
+                # Connection dropped or timed out before a response arrived
+                if attempt < self.max_retries:
+                    attempt += 1
+                    with self._lock:
+                        self.report["retried"] += len(batch)
+                    logging.warning(f"Upload of {len(batch)} documents failed ({type(e).__name__}), retry {attempt}/{self.max_retries}")
+                    self._backoff(attempt)
+                    continue
+                self._record_failures(batch, str(e))
+                return
+            except AzureError as e:
+                self._record_failures(batch, str(e))
+                return
+
+            by_key = {document[self.key_field]: document for document in batch}
+            retry, succeeded = [], 0
+            for result in results:
+                if result.succeeded:
+                    succeeded += 1
+                elif result.status_code in RETRYABLE_DOCUMENT_STATUS and attempt < self.max_retries:
+                    retry.append(by_key[result.key])
+                else:
+                    with self._lock:
+                        self.report["failed"][result.key] = f"{result.status_code}: {result.error_message}"
+
+            with self._lock:
+                self.report["succeeded"] += succeeded
+                self.report["retried"] += len(retry)
+            if retry:
+                attempt += 1
+                logging.warning(f"Retrying {len(retry)} failed documents, attempt {attempt}/{self.max_retries}")
+                self._backoff(attempt)
+            batch = retry
+
+    def _record_failures(self, batch: List[Dict[str, Any]], error: str):
+        logging.error(f"Upload of {len(batch)} documents failed: {error}")
+        with self._lock:
+            for document in batch:
+                self.report["failed"][document[self.key_field]] = error
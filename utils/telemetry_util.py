@@ -1,6 +1,10 @@
+import io
+import csv
+import time
+from datetime import datetime, timezone
 import pandas as pd
 import logging
-from typing import Optional, Dict, Any, Union, Callable
+from typing import Optional, Dict, Any, Union, Callable, Iterable, Iterator, Tuple
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -26,6 +30,23 @@ GAINS_COLUMN_MAPPING: Dict[str, Union[str, Dict[str, str], Callable]] = {
     'GAIN-VALUE': 'GAIN-VALUE'
 }
 
+def filter_by_apc(df: pd.DataFrame, apc_name: str) -> pd.DataFrame:
+    """
+    Filter telemetry rows to the tags of one APC.
+
+    Args:
+        df (pd.DataFrame): Telemetry export.
+        apc_name (str): APC name to filter the data.
+
+    Returns:
+        pd.DataFrame: Rows whose tag name contains the APC name.
+    """
+    logging.info(f"Filtering data for APC: {apc_name}")
+    filtered_df = df[df['IDX_TagName'].str.contains(apc_name, case=True, na=False)]
+
+    logging.info(f"Filtered data shape: {filtered_df.shape}")
+    return filtered_df
+
 def load_and_filter_data(datasource: str, apc_name: str) -> pd.DataFrame:
     """
     Load data from a CSV file and filter it based on the APC name.
@@ -41,11 +62,7 @@ def load_and_filter_data(datasource: str, apc_name: str) -> pd.DataFrame:
         logging.info(f"Loading data from {datasource}")
         df = pd.read_csv(datasource)
         
-        logging.info(f"Filtering data for APC: {apc_name}")
-        filtered_df = df[df['IDX_TagName'].str.contains(apc_name, case=True, na=False)]
-        
-        logging.info(f"Filtered data shape: {filtered_df.shape}")
-        return filtered_df
+        return filter_by_apc(df, apc_name)
     
     except FileNotFoundError:
         logging.error(f"File not found: {datasource}")
@@ -57,6 +74,12 @@ def load_and_filter_data(datasource: str, apc_name: str) -> pd.DataFrame:
         logging.error(f"An error occurred while processing the data: {str(e)}")
         raise
 
+def format_violation_message(tag: str, value: float, minimum: float, maximum: float) -> str:
+    """Render the alert message used for threshold violations."""
+    if value < minimum:
+        return f"{tag}: Current value {value} is less than Minimum value {minimum}"
+    return f"{tag}: Current value {value} is greater than Maximum value {maximum}"
+
 def get_treshold_violations(df):
     # Create masks for violations
     below_min_mask = df['ValueReal'] < df['IDX_Minimum']
@@ -67,13 +90,30 @@ def get_treshold_violations(df):
     
     # Add a new 'message' column
     violations_df['message'] = violations_df.apply(
-        lambda row: f"{row['IDX_TagName']}: Current value {row['ValueReal']} is {'less than Minimum' if row['ValueReal'] < row['IDX_Minimum'] else 'greater than Maximum'} value {row['IDX_Minimum'] if row['ValueReal'] < row['IDX_Minimum'] else row['IDX_Maximum']}",
+        lambda row: format_violation_message(row['IDX_TagName'], row['ValueReal'], row['IDX_Minimum'], row['IDX_Maximum']),
         axis=1
     )
     
     return violations_df
 
-def format_gains_map(df: pd.DataFrame, log_level: str = 'INFO') -> Optional[pd.DataFrame]:
+def format_gains_map(
+    df: pd.DataFrame,
+    log_level: str = 'INFO',
+    cv_tag_filter: Optional[str] = 'J140-BIN',
+    gain_tag_filter: Optional[str] = 'PROFIT_AVERAGE_BIN_LEVEL'
+) -> Optional[pd.DataFrame]:
+    """
+    Filter and rename a raw gains map export into its readable form.
+
+    Args:
+        df (pd.DataFrame): Raw gains map with the export column names.
+        log_level (str): Unused, kept for backwards compatibility.
+        cv_tag_filter (str, optional): Keep only CV tags containing this value. None keeps all CVs.
+        gain_tag_filter (str, optional): Keep only gain tags containing this value. None keeps all gains.
+
+    Returns:
+        pd.DataFrame: Formatted gains map.
+    """
     try:
         # Validate input
         if not isinstance(df, pd.DataFrame):
@@ -88,12 +128,13 @@ def format_gains_map(df: pd.DataFrame, log_level: str = 'INFO') -> Optional[pd.D
         df_transformed = df.copy()
         logging.info("Created copy of input DataFrame")
         
-        # Add new filtering conditions
-        logging.info("Applying filters for J140-BIN and PROFIT_AVERAGE_STOCKPILE_LEVEL")
-        df_transformed = df_transformed[
-            df_transformed['CVAPETTAG'].str.contains('J140-BIN', case=True, na=False) &
-            df_transformed['GAIN-TAG'].str.contains('PROFIT_AVERAGE_BIN_LEVEL', case=True, na=False)
-        ]
+        # Apply optional CV and gain tag filters
+        if cv_tag_filter is not None:
+            logging.info(f"Applying CV tag filter: {cv_tag_filter}")
+            df_transformed = df_transformed[df_transformed['CVAPETTAG'].str.contains(cv_tag_filter, case=True, na=False, regex=False)]
+        if gain_tag_filter is not None:
+            logging.info(f"Applying gain tag filter: {gain_tag_filter}")
+            df_transformed = df_transformed[df_transformed['GAIN-TAG'].str.contains(gain_tag_filter, case=True, na=False, regex=False)]
         logging.info(f"After filtering, DataFrame shape: {df_transformed.shape}")
         
         # Process each column according to its mapping type
@@ -142,3 +183,293 @@ def format_gains_map(df: pd.DataFrame, log_level: str = 'INFO') -> Optional[pd.D
         
     finally:
         logging.debug("Format gains map function execution completed")
+
+# Streaming violation detection
+TAG_NAME_FIELD = 'IDX_TagName'
+VALUE_FIELD = 'ValueReal'
+MINIMUM_FIELD = 'IDX_Minimum'
+MAXIMUM_FIELD = 'IDX_Maximum'
+TIMESTAMP_FIELD = 'Timestamp'
+EVENTHUB_POLL_INTERVAL = 1.0  # Seconds between EventHub read sessions
+EVENTHUB_MAX_BACKOFF = 60.0  # Upper bound on the wait after repeated EventHub read errors
+
+def parse_event_time(value: Any) -> Optional[float]:
+    """
+    Convert an event timestamp to epoch seconds.
+
+    Args:
+        value (Any): Epoch seconds, or an ISO 8601 string such as the export's
+            Timestamp column or EventHub's `created`. Naive times are taken as UTC.
+
+    Returns:
+        Optional[float]: Epoch seconds, or None if the value cannot be parsed.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def load_tag_limits(df: pd.DataFrame) -> Dict[str, Tuple[float, float]]:
+    """
+    Build a {tag: (minimum, maximum)} lookup from a telemetry export.
+
+    Used to supply limits for event sources such as EventHub that only carry
+    tag values. The last row seen for a tag wins.
+
+    Args:
+        df (pd.DataFrame): Telemetry export with tag name and limit columns.
+
+    Returns:
+        Dict[str, Tuple[float, float]]: Limits per tag.
+    """
+    limits = df[[TAG_NAME_FIELD, MINIMUM_FIELD, MAXIMUM_FIELD]].drop_duplicates(TAG_NAME_FIELD, keep='last')
+    return {
+        tag: (float(minimum), float(maximum))
+        for tag, minimum, maximum in limits.itertuples(index=False, name=None)
+    }
+
+class StreamingViolationDetector:
+    """
+    Incremental threshold violation detector over tag-value events.
+
+    Keeps a small state per tag so a tag sitting outside its limits raises a
+    single alert when it crosses, instead of one alert per sample. A tag only
+    returns to normal once it is back inside its limits by the hysteresis
+    deadband, which stops values hovering at a limit from flapping.
+
+    Events are dicts with the same columns as the telemetry export
+    (IDX_TagName, ValueReal, IDX_Minimum, IDX_Maximum and optionally
+    Timestamp). Missing limits are taken from `limits`.
+
+    Re-alerting is measured in event time (the Timestamp column), so
+    replaying a file or an EventHub backlog alerts as it would have live.
+    Events without a parseable timestamp fall back to the wall clock.
+    """
+
+    NORMAL = 'normal'
+    BELOW_MIN = 'below_min'
+    ABOVE_MAX = 'above_max'
+
+    def __init__(
+        self,
+        apc_name: Optional[str] = None,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        hysteresis: float = 0.02,
+        min_deadband: float = 0.0,
+        realert_after: Optional[float] = None
+    ):
+        """
+        Args:
+            apc_name (str, optional): Only track tags containing this APC name.
+            limits (Dict[str, Tuple[float, float]], optional): Fallback (min, max) per tag.
+            hysteresis (float): Deadband as a fraction of the tag's limit span.
+            min_deadband (float): Absolute lower bound on the deadband.
+            realert_after (float, optional): Seconds of event time after which a
+                tag still in violation alerts again. None alerts once per excursion.
+        """
+        self.apc_name = apc_name
+        self.limits = limits or {}
+        self.hysteresis = hysteresis
+        self.min_deadband = min_deadband
+        self.realert_after = realert_after
+        self.tag_state: Dict[str, Dict[str, Any]] = {}
+        self.events_processed = 0
+        self.violations_emitted = 0
+
+    def _deadband(self, minimum: float, maximum: float) -> float:
+        return max(self.hysteresis * abs(maximum - minimum), self.min_deadband)
+
+    def _classify(self, state: str, value: float, minimum: float, maximum: float) -> str:
+        deadband = self._deadband(minimum, maximum)
+        if value < minimum:
+            return self.BELOW_MIN
+        if value > maximum:
+            return self.ABOVE_MAX
+        # Inside the limits: only leave a violation state once clear of the deadband
+        if state == self.BELOW_MIN and value < minimum + deadband:
+            return state
+        if state == self.ABOVE_MAX and value > maximum - deadband:
+            return state
+        return self.NORMAL
+
+    def process(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Update tag state with one event.
+
+        Args:
+            event (Dict[str, Any]): Tag-value event.
+
+        Returns:
+            Optional[Dict[str, Any]]: A violation record if this event raises
+            an alert, otherwise None.
+        """
+        tag = event.get(TAG_NAME_FIELD)
+        if tag is None or (self.apc_name and self.apc_name not in tag):
+            return None
+
+        try:
+            value = float(event[VALUE_FIELD])
+            fallback = self.limits.get(tag, (None, None))
+            # Blank cells, e.g. empty limit columns of a tailed CSV, count as missing
+            minimum = event.get(MINIMUM_FIELD)
+            maximum = event.get(MAXIMUM_FIELD)
+            minimum = fallback[0] if minimum is None or minimum == "" else minimum
+            maximum = fallback[1] if maximum is None or maximum == "" else maximum
+            if minimum is None or maximum is None:
+                logging.debug(f"No limits known for tag {tag}, skipping event")
+                return None
+            minimum, maximum = float(minimum), float(maximum)
+        except (KeyError, TypeError, ValueError) as e:
+            logging.warning(f"Skipping malformed telemetry event for {tag}: {e}")
+            return None
+
+        self.events_processed += 1
+        detected_at = time.time()
+        event_time = parse_event_time(event.get(TIMESTAMP_FIELD))
+        now = event_time if event_time is not None else detected_at
+        tag_state = self.tag_state.setdefault(tag, {'state': self.NORMAL, 'last_alert': None})
+        previous = tag_state['state']
+        current = self._classify(previous, value, minimum, maximum)
+        tag_state['state'] = current
+
+        if current == self.NORMAL:
+            if previous != self.NORMAL:
+                logging.info(f"Tag {tag} returned within limits at value {value}")
+            return None
+
+        repeat_due = (
+            self.realert_after is not None
+            and tag_state['last_alert'] is not None
+            and now - tag_state['last_alert'] >= self.realert_after
+        )
+        if current == previous and not repeat_due:
+            return None
+
+        tag_state['last_alert'] = now
+        self.violations_emitted += 1
+        return {
+            TAG_NAME_FIELD: tag,
+            VALUE_FIELD: value,
+            MINIMUM_FIELD: minimum,
+            MAXIMUM_FIELD: maximum,
+            TIMESTAMP_FIELD: event.get(TIMESTAMP_FIELD),
+            'violation': current,
+            'detected_at': detected_at,
+            'message': format_violation_message(tag, value, minimum, maximum)
+        }
+
+    def detect(self, events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Consume an event stream and yield violations as soon as they are raised.
+
+        Args:
+            events (Iterable[Dict[str, Any]]): Tag-value events, e.g. from
+                iter_csv_tail or iter_eventhub_events.
+
+        Yields:
+            Dict[str, Any]: Violation records.
+        """
+        for event in events:
+            violation = self.process(event)
+            if violation is not None:
+                yield violation
+
+def iter_csv_tail(
+    file_path: str,
+    poll_interval: float = 1.0,
+    from_start: bool = False,
+    stop: Optional[Callable[[], bool]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Follow a telemetry CSV file and yield rows as they are appended.
+
+    Args:
+        file_path (str): CSV file with a header row.
+        poll_interval (float): Seconds to wait before checking for new rows.
+        from_start (bool): Also yield the rows already in the file.
+        stop (Callable[[], bool], optional): Polled between reads; return True to stop.
+
+    Rows are buffered until they end with a newline outside quotes, so quoted
+    fields spanning several lines are parsed as one row.
+
+    Yields:
+        Dict[str, Any]: One event per CSV row.
+    """
+    logging.info(f"Tailing telemetry file {file_path}")
+    with open(file_path, 'r', newline='') as f:
+        header_row = f.readline()
+        while header_row.count('"') % 2:
+            header_row += f.readline()
+        header = next(csv.reader([header_row]))
+        if not from_start:
+            f.seek(0, 2)
+        pending = ""
+        while not (stop and stop()):
+            line = f.readline()
+            if not line:
+                time.sleep(poll_interval)
+                continue
+            pending += line
+            if not pending.endswith('\n') or pending.count('"') % 2:
+                # Partial row still being written, or a newline inside a quoted field
+                continue
+            row, pending = pending, ""
+            values = next(csv.reader(io.StringIO(row)), None)
+            if values:
+                yield dict(zip(header, values))
+
+def iter_eventhub_events(
+    poll_interval: float = EVENTHUB_POLL_INTERVAL,
+    stop: Optional[Callable[[], bool]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Poll the EventHub read endpoint and yield tag-value events.
+
+    EventHub messages carry `tag`, `tagValue` and `created`; they are mapped
+    onto the telemetry export columns. Limits are not part of the message,
+    so pair this with a detector built with `limits`.
+
+    Args:
+        poll_interval (float): Seconds to wait between read sessions. After a
+            failed read the wait doubles per consecutive error, up to
+            EVENTHUB_MAX_BACKOFF.
+        stop (Callable[[], bool], optional): Polled between sessions; return True to stop.
+
+    Yields:
+        Dict[str, Any]: One event per EventHub message.
+    """
+    from utils.api_util import get_api_response
+
+    errors = 0
+    while not (stop and stop()):
+        response = get_api_response("/eventhub/read", method="POST")
+        if response.get("error"):
+            errors += 1
+            delay = min(max(poll_interval, 1.0) * 2 ** (errors - 1), EVENTHUB_MAX_BACKOFF)
+            logging.error(f"EventHub read failed ({errors} in a row), retrying in {delay:.0f}s: {response.get('message')}")
+            time.sleep(delay)
+            continue
+
+        errors = 0
+        data = response.get("data") or {}
+        messages = data.get("data", []) if isinstance(data, dict) else data
+        for message in messages:
+            yield {
+                TAG_NAME_FIELD: message.get('tag'),
+                VALUE_FIELD: message.get('tagValue'),
+                TIMESTAMP_FIELD: message.get('created')
+            }
+        if poll_interval:
+            time.sleep(poll_interval)
@@ -0,0 +1,12 @@
+import re
+
+# Lexical terms shared by passage scoring and the local BM25 index
+TERM_PATTERN = re.compile(r"[a-z0-9][a-z0-9_.\-]*")
+STOPWORDS = frozenset(["a", "an", "and", "are", "as", "at", "be", "by", "can", "could", "describe", "detail",
+                       "do", "does", "done", "for", "from", "further", "give", "how", "in", "is", "it", "of",
+                       "on", "or", "please", "should", "that", "the", "this", "to", "was", "what", "when",
+                       "where", "which", "why", "with"])
+
+def tokenize_terms(text):
+    """Lowercased lexical terms; tag names such as PID-J141-LIC-G1118.OP stay whole."""
+    return [term.strip('.-') for term in TERM_PATTERN.findall(text.lower())]
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Trace file the spans of this process and its worker processes are appended to; unset disables writing
+TRACE_FILE_ENV = "TRACE_FILE"
+
+_write_lock = threading.Lock()
+# Collectors of the spans finished in the current context, innermost last
+_collectors: contextvars.ContextVar = contextvars.ContextVar("trace_collectors", default=())
+
+class Span:
+    """
+    One timed stage, e.g. a search or an LLM call.
+
+    Attributes such as token counts, payload sizes and cache hits are set
+    with set() while the span is open and are written with its duration.
+    """
+
+    def __init__(self, name: str, category: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+        self.start_us = time.time_ns() // 1000
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def event(self) -> Dict[str, Any]:
+        """The span as a complete ("X") event of the Chrome trace event format."""
+        return {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": self.start_us,
+            "dur": round(self.seconds * 1_000_000),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": self.attributes
+        }
+
+class SpanCollector:
+    """Spans finished while a collect_spans() block was active, including those of nested spans."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> Dict[str, Any]:
+        """
+        Time per stage, for attaching to a result record.
+
+        Returns:
+            dict: The total milliseconds and, per span name, the number of
+            spans, their summed milliseconds and their summed numeric
+            attributes (e.g. tokens).
+        """
+        stages: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            stage = stages.setdefault(span.name, {"count": 0, "ms": 0.0})
+            stage["count"] += 1
+            stage["ms"] += span.seconds * 1000
+            for key, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage[key] = stage.get(key, 0) + value
+        for stage in stages.values():
+            stage["ms"] = round(stage["ms"], 1)
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 1), "stages": stages}
+
+def get_trace_file() -> Optional[str]:
+    return os.getenv(TRACE_FILE_ENV) or None
+
+def enable_tracing(trace_file: str):
+    """
+    Append spans to trace_file from now on, in this process and in worker processes started later.
+
+    The file is a Chrome trace event JSON array, which can be opened in
+    https://ui.perfetto.dev or chrome://tracing as a timeline/flame chart.
+    Events are appended one per line and the closing bracket is omitted,
+    which both viewers accept, so runs and processes can share one file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+    os.environ[TRACE_FILE_ENV] = trace_file
+
+def _write(event: Dict[str, Any], trace_file: str):
+    line = json.dumps(event, default=str)
+    with _write_lock:
+        try:
+            # Only the process that creates the file writes the opening bracket
+            fd = os.open(trace_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND)
+            os.write(fd, b"[\n")
+        except FileExistsError:
+            fd = os.open(trace_file, os.O_WRONLY | os.O_APPEND)
+        try:
+            # One write per event, so events of concurrent processes do not interleave
+            os.write(fd, f"{line},\n".encode("utf-8"))
+        finally:
+            os.close(fd)
+
+@contextmanager
+def span(name: str, category: str = "app", **attributes) -> Iterator[Span]:
+    """
+    Time a block as a span.
+
+        with span("search_documents", "retrieval", query_chars=len(query)) as s:
+            results = search(query)
+            s.set(results=len(results))
+
+    The span is reported to every active collect_spans() block and, when
+    tracing is enabled, appended to the trace file, also if the block raises.
+    """
+    current = Span(name, category, attributes)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.seconds = time.perf_counter() - current.started
+        for collector in _collectors.get():
+            collector.add(current)
+        trace_file = get_trace_file()
+        if trace_file:
+            _write(current.event(), trace_file)
+
+def traced(name: Optional[str] = None, category: str = "app") -> Callable:
+    """Decorator form of span(), named after the function unless a name is given."""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def collect_spans() -> Iterator[SpanCollector]:
+    """
+    Collect the spans finished inside the block, e.g. for a timing breakdown per record.
+
+        with collect_spans() as spans:
+            answer = answer_question(...)
+        record["timing"] = spans.breakdown()
+    """
+    collector = SpanCollector()
+    token = _collectors.set(_collectors.get() + (collector,))
+    try:
+        yield collector
+    finally:
+        _collectors.reset(token)
+
+def bind_context(function: Callable) -> Callable:
+    """
+    Run function in a copy of the caller's context, e.g. when submitted to a thread pool.
+
+    Executor threads do not inherit context variables, so without this the
+    spans of pooled work would not reach the caller's collect_spans().
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call gets its own copy
+        return context.copy().run(function, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,200 @@
+import os
+import json
+import logging
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Location of local vector indexes, one directory per search index
+VECTOR_INDEX_DIR = os.path.join(".cache", "vector_index")
+VECTOR_DTYPES = ("float32", "float16", "int8")  # Storage formats; int8 uses a scale per row
+DEFAULT_VECTOR_DTYPE = "float16"  # Halves the size of float32 with negligible loss in ranking
+SEARCH_BLOCK_ROWS = 16384  # Rows scored at a time, bounding memory for large indexes
+METADATA_FIELDS = ("id", "content", "sourcefile", "page", "chunk_id")
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so dot products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """
+    Convert unit-length float32 rows to the storage format.
+
+    Returns:
+        tuple: (stored matrix, per-row scales or None)
+    """
+    if dtype == "float32":
+        return vectors.astype(np.float32), None
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unsupported vector dtype: {dtype}, expected one of {VECTOR_DTYPES}")
+
+class LocalVectorIndex:
+    """
+    In-process vector index over the chunks of one search index.
+
+    Holds the same chunk embeddings that are uploaded to Azure AI Search,
+    normalized to unit length and stored as float32, float16 or int8, with
+    the chunk metadata alongside. Saved indexes are memory-mapped on load,
+    so opening one is cheap and only the rows being scored are paged in.
+    Queries are scored in blocks with one matrix product per block for the
+    whole query batch, keeping a running top-k per query.
+
+        index = LocalVectorIndex.load("pwo_embeddings")
+        hits = index.search([query_embedding], top_k=3, sourcefiles=["manual.pdf"])[0]
+    """
+
+    def __init__(self, index_name: str, dtype: str = DEFAULT_VECTOR_DTYPE, index_dir: str = VECTOR_INDEX_DIR):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}, expected one of {VECTOR_DTYPES}")
+        self.index_name = index_name
+        self.dtype = dtype
+        self.path = os.path.join(index_dir, index_name)
+        self.vectors: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.metadata: List[Dict[str, Any]] = []
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_metadata: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.metadata) + len(self._pending_metadata)
+
+    @classmethod
+    def exists(cls, index_name: str, index_dir: str = VECTOR_INDEX_DIR) -> bool:
+        return os.path.exists(os.path.join(index_dir, index_name, "index.json"))
+
+    @classmethod
+    def load(cls, index_name: str, index_dir: str = VECTOR_INDEX_DIR) -> 'LocalVectorIndex':
+        """Open a saved index, memory-mapping its vectors."""
+        path = os.path.join(index_dir, index_name)
+        with open(os.path.join(path, "index.json"), 'r') as f:
+            info = json.load(f)
+        index = cls(index_name, info["dtype"], index_dir)
+        with open(os.path.join(path, "metadata.json"), 'r') as f:
+            index.metadata = json.load(f)
+        if index.metadata:
+            index.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode='r')
+            if index.dtype == "int8":
+                index.scales = np.load(os.path.join(path, "scales.npy"))
+        return index
+
+    @classmethod
+    def load_or_create(cls, index_name: str, dtype: str = DEFAULT_VECTOR_DTYPE,
+                       index_dir: str = VECTOR_INDEX_DIR) -> 'LocalVectorIndex':
+        if cls.exists(index_name, index_dir):
+            try:
+                index = cls.load(index_name, index_dir)
+                if index.dtype == dtype:
+                    return index
+                logging.info(f"Local vector index {index_name} is stored as {index.dtype}, rebuilding as {dtype}")
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable local vector index {index_name}: {e}")
+        return cls(index_name, dtype, index_dir)
+
+    def add(self, document: Dict[str, Any], vector_field: str = "content_vector"):
+        """Queue a chunk document, as uploaded to Azure AI Search, for the next save()."""
+        self._pending_vectors.append(np.asarray(document[vector_field], dtype=np.float32))
+        self._pending_metadata.append({field: document.get(field) for field in METADATA_FIELDS})
+
+    def remove_sourcefiles(self, sourcefiles: Iterable[str]):
+        """Drop all chunks of the given source files, e.g. before re-adding changed documents."""
+        sourcefiles = set(sourcefiles)
+        if not sourcefiles:
+            return
+        keep = [row for row, metadata in enumerate(self.metadata) if metadata.get("sourcefile") not in sourcefiles]
+        if len(keep) < len(self.metadata):
+            self.vectors = np.asarray(self.vectors[keep]) if keep else None
+            self.scales = self.scales[keep] if self.scales is not None and keep else None
+            self.metadata = [self.metadata[row] for row in keep]
+        pending = [i for i, metadata in enumerate(self._pending_metadata) if metadata.get("sourcefile") not in sourcefiles]
+        self._pending_vectors = [self._pending_vectors[i] for i in pending]
+        self._pending_metadata = [self._pending_metadata[i] for i in pending]
+
+    def clear(self):
+        self.vectors, self.scales, self.metadata = None, None, []
+        self._pending_vectors, self._pending_metadata = [], []
+
+    def save(self):
+        """Merge queued chunks into the index and write it to disk."""
+        if self._pending_vectors:
+            vectors, scales = quantize(normalize(np.stack(self._pending_vectors)), self.dtype)
+            if self.vectors is not None and len(self.metadata):
+                vectors = np.concatenate([np.asarray(self.vectors), vectors])
+                scales = np.concatenate([self.scales, scales]) if scales is not None else None
+            self.vectors, self.scales = vectors, scales
+            self.metadata = self.metadata + self._pending_metadata
+            self._pending_vectors, self._pending_metadata = [], []
+
+        os.makedirs(self.path, exist_ok=True)
+        if self.metadata:
+            # Write to temporary files first: the current vectors may be memory-mapped from the target
+            np.save(os.path.join(self.path, "vectors.tmp.npy"), np.asarray(self.vectors))
+            os.replace(os.path.join(self.path, "vectors.tmp.npy"), os.path.join(self.path, "vectors.npy"))
+            if self.scales is not None:
+                np.save(os.path.join(self.path, "scales.npy"), self.scales)
+        with open(os.path.join(self.path, "metadata.json"), 'w') as f:
+            json.dump(self.metadata, f)
+        with open(os.path.join(self.path, "index.json"), 'w') as f:
+            json.dump({"dtype": self.dtype, "count": len(self.metadata),
+                       "dimension": int(self.vectors.shape[1]) if self.metadata else None}, f)
+        logging.info(f"Saved local vector index {self.index_name} with {len(self.metadata)} chunks as {self.dtype}")
+
+    def _allowed_rows(self, sourcefiles: Optional[Sequence[str]]) -> Optional[np.ndarray]:
+        if not sourcefiles:
+            return None
+        sourcefiles = set(sourcefiles)
+        return np.fromiter((metadata.get("sourcefile") in sourcefiles for metadata in self.metadata),
+                           dtype=bool, count=len(self.metadata))
+
+    def search(self, query_vectors: Sequence[Sequence[float]], top_k: int = 3,
+               sourcefiles: Optional[Sequence[str]] = None,
+               block_rows: int = SEARCH_BLOCK_ROWS) -> List[List[Dict[str, Any]]]:
+        """
+        Cosine top-k for a batch of query embeddings.
+
+        Args:
+            query_vectors (Sequence[Sequence[float]]): One embedding per query.
+            top_k (int): Results per query.
+            sourcefiles (Sequence[str], optional): Only return chunks of these files.
+            block_rows (int): Rows scored per matrix product.
+
+        Returns:
+            List[List[Dict[str, Any]]]: Per query, the best chunks' metadata
+            with a "score" (cosine similarity), best first.
+        """
+        queries = normalize(np.atleast_2d(query_vectors))
+        if self.vectors is None or not self.metadata or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        allowed = self._allowed_rows(sourcefiles)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self.metadata), block_rows):
+            stop = min(start + block_rows, len(self.metadata))
+            scores = queries @ np.asarray(self.vectors[start:stop], dtype=np.float32).T
+            if self.scales is not None:
+                scores *= self.scales[start:stop]
+            if allowed is not None:
+                scores[:, ~allowed[start:stop]] = -np.inf
+
+            # Merge the block with the running top-k of every query
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, stop), (len(queries), stop - start))], axis=1)
+            if scores.shape[1] > top_k:
+                keep = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores, axis=1)
+        results = []
+        for query_scores, query_rows, query_order in zip(best_scores, best_rows, order):
+            results.append([
+                dict(self.metadata[query_rows[i]], score=float(query_scores[i]))
+                for i in query_order if np.isfinite(query_scores[i])
+            ])
+        return results